@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+'''
+Persistent cache of LLM answers in a local SQLite file, keyed by a hash of the
+profession, its description, the normalized question, the model and the
+prompt version. Entries expire after a TTL and the least recently used ones
+are evicted above a size limit.
+'''
+
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite3')
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 7 * 24 * 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 10000))
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case-folds the question, collapses whitespace and drops trailing punctuation,
+    so trivially different spellings of the same question share an entry.
+    """
+    return ' '.join(question.casefold().split()).rstrip(' ?!.')
+
+
+def make_answer_key(
+    profession: str,
+    profession_description: str,
+    question: str,
+    model: str,
+    prompt_version: int
+    ) -> str:
+    payload = json.dumps(
+        [profession.strip(), profession_description.strip(), normalize_question(question), model, prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """
+    SQLite-backed answer cache, safe to share between threads and between
+    processes using the same file.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS answers_accessed_at ON answers (accessed_at)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT answer FROM answers WHERE key = ? AND created_at >= ?',
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute('UPDATE answers SET accessed_at = ? WHERE key = ?', (now, key))
+            connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, answer: str) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO answers (key, answer, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, answer, now, now)
+            )
+            # Drop expired entries, then the least recently used ones above the limit
+            connection.execute('DELETE FROM answers WHERE created_at < ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM answers WHERE key IN '
+                '(SELECT key FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._connect().execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'sqlite',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': size,
+            'max_size': self.max_entries,
+            'ttl': self.ttl
+        }
+
+
+answer_cache = AnswerCache(ANSWER_CACHE_PATH, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES)
@@ -1,10 +1,9 @@
-import openai
-import os
 import asyncio
 import logging
-from database import get_one_friend
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional
+from answer_cache import answer_cache, make_answer_key
+from llm_gateway import LLMBusyError, get_llm_gateway
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -12,37 +11,85 @@ logger = logging.getLogger(__name__)
 LLM from OpenAI analyzes data obtained from the database and writes answers to questions asked by people about professions. 
 '''
 
+MODEL = 'gpt-4o'
+# Bump whenever the prompt below changes so cached answers are not reused
+PROMPT_VERSION = 1
+
+
+async def read_cached_answer(cache_key: str) -> Optional[str]:
+    # The cache only speeds answers up: a failing cache is a miss
+    try:
+        return await asyncio.to_thread(answer_cache.get, cache_key)
+    except Exception as e:
+        logger.error(f"Answer cache read failed: {e}")
+        return None
+
+
+async def store_answer(cache_key: str, answer: str) -> None:
+    try:
+        await asyncio.to_thread(answer_cache.set, cache_key, answer)
+    except Exception as e:
+        logger.error(f"Answer cache write failed: {e}")
+
+
 class AIManager:
     def __init__(self, question: str, profession_data: Dict):
         self.question = question
-        self.client = openai.AsyncOpenAI(api_key = os.getenv('OPENAI_APY_KEY'))
         self.profession = profession_data['Profession']
         self.profession_description = profession_data['ProfessionDescription']
         
     
-    async def answers_to_questions(self):
+    def cache_key(self) -> str:
+        return make_answer_key(self.profession, self.profession_description, self.question, MODEL, PROMPT_VERSION)
+
+
+    def messages(self) -> List[Dict[str, str]]:
         prompt = f'''
              Profession: {self.profession}, description: {self.profession_description}. Answer this question: {self.question}.
             If you understand at least 20 percent of the question, try to answer it. If you do not understand the question at all, indicate this and give an example of a correct question. Otherwise, just answer the question.
             Write your answer in the same language as the question, without emphasizing this.
             '''
+        return [
+            {'role': 'system', 'content': 'You are an expert on professions and know everything about them. Answer the question.'},
+            {'role': 'user', 'content': prompt}
+        ]
+
+
+    async def answers_to_questions(self):
+        # Repeat questions about the same profession are answered from the cache
+        cache_key = self.cache_key()
+        cached = await read_cached_answer(cache_key)
+        if cached is not None:
+            return cached
 
-        
         try:
-            response = await self.client.chat.completions.create(
-                model='gpt-4o',
-                messages=[
-                    {'role': 'system', 'content': 'You are an expert on professions and know everything about them. Answer the question.'},
-                    {'role': 'user', 'content': prompt}
-                ],
+            answer = await get_llm_gateway().complete(
+                model=MODEL,
+                messages=self.messages(),
                 temperature=0.7
             )
-            answer = response.choices[0].message.content.strip()
-            return answer
+        except LLMBusyError:
+            raise
         except Exception as e:
             logger.error(f"An unexpected error occurred for request:  {e}")
             return  None
+        await store_answer(cache_key, answer)
+        return answer
 
 
+    async def stream_answer(self) -> AsyncIterator[str]:
+        # A cached answer is sent as a single piece
+        cache_key = self.cache_key()
+        cached = await read_cached_answer(cache_key)
+        if cached is not None:
+            yield cached
+            return
 
+        pieces = []
+        async for piece in get_llm_gateway().stream(model=MODEL, messages=self.messages(), temperature=0.7):
+            pieces.append(piece)
+            yield piece
 
+        answer = ''.join(pieces).strip()
+        if answer:
+            await store_answer(cache_key, answer)
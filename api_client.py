@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+'''
+Async client the Telegram bot uses to call the FastAPI backend. One pooled
+httpx.AsyncClient is shared by every handler, each call has a timeout, and
+failed calls are retried with jittered exponential backoff: connection
+failures always (the request never reached the backend), timeouts and
+502/503/504 responses only for idempotent methods.
+'''
+
+API_MAX_CONNECTIONS = int(os.getenv('API_MAX_CONNECTIONS', 20))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 10))
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', 3))
+API_BACKOFF_BASE = 0.2
+API_BACKOFF_CAP = 3.0
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# Chunk size used when relaying a download into an upload
+RELAY_CHUNK_SIZE = 64 * 1024
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for the given retry attempt (1-based).
+    """
+    return random.uniform(0, min(API_BACKOFF_CAP, API_BACKOFF_BASE * 2 ** attempt))
+
+
+def quote_header_value(value: str) -> str:
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+async def iter_multipart(
+    boundary: str,
+    fields: Dict[str, str],
+    file_field: str,
+    filename: str,
+    content_type: str,
+    chunks: AsyncIterable[bytes]
+    ) -> AsyncIterator[bytes]:
+    """
+    Yields a multipart/form-data body: the text fields first, then the file
+    part, whose content is passed through chunk by chunk as it arrives.
+    """
+    for name, value in fields.items():
+        yield (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{quote_header_value(name)}"\r\n\r\n'
+        ).encode('utf-8') + str(value).encode('utf-8') + b'\r\n'
+    yield (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{quote_header_value(file_field)}"; filename="{quote_header_value(filename)}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8')
+    async for chunk in chunks:
+        yield chunk
+    yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+
+class FriendsAPI:
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = API_MAX_CONNECTIONS,
+        timeout: float = API_TIMEOUT,
+        max_retries: int = API_MAX_RETRIES
+        ):
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    def url(self, path: str = '') -> str:
+        return f'{self.base_url}{path}'
+
+    async def request(self, method: str, path: str = '', **kwargs: Any) -> httpx.Response:
+        """
+        Sends one request to the backend, retrying transient failures.
+        Returns the final response without raising for its status.
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, self.url(path), **kwargs)
+                if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries):
+                    return response
+                await response.aclose()
+                logging.warning(f'Backend returned {response.status_code} for {method} {self.url(path)}, retrying')
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logging.warning(f'Backend unreachable for {method} {self.url(path)}: {e}, retrying')
+            except httpx.TransportError as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                logging.warning(f'Backend request {method} {self.url(path)} failed: {e}, retrying')
+            attempt += 1
+            await asyncio.sleep(backoff_delay(attempt))
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str = '', **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """
+        Opens a streamed response. Streams are not retried once started.
+        """
+        async with self.client.stream(method.upper(), self.url(path), **kwargs) as response:
+            yield response
+
+    async def post_file_stream(
+        self,
+        path: str,
+        fields: Dict[str, str],
+        file_field: str,
+        filename: str,
+        content_type: str,
+        chunks: AsyncIterable[bytes],
+        **kwargs: Any
+        ) -> httpx.Response:
+        """
+        Posts a multipart form whose file part is streamed from `chunks`
+        (chunked transfer encoding), so the file is never held in memory.
+        Not retried: the chunks can only be consumed once.
+        """
+        boundary = uuid.uuid4().hex
+        headers = {**kwargs.pop('headers', {}), 'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        return await self.client.post(
+            self.url(path),
+            content=iter_multipart(boundary, fields, file_field, filename, content_type, chunks),
+            headers=headers,
+            **kwargs
+        )
+
+    async def relay_file(
+        self,
+        source_url: str,
+        path: str,
+        fields: Dict[str, str],
+        file_field: str,
+        filename: str,
+        content_type: str,
+        **kwargs: Any
+        ) -> httpx.Response:
+        """
+        Downloads `source_url` and streams it into a multipart upload to the
+        backend at the same time, one chunk in memory at a time.
+        """
+        async with self.client.stream('GET', source_url) as download:
+            download.raise_for_status()
+            return await self.post_file_stream(
+                path,
+                fields,
+                file_field,
+                filename,
+                content_type,
+                download.aiter_bytes(RELAY_CHUNK_SIZE),
+                **kwargs
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
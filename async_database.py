@@ -0,0 +1,151 @@
+import functools
+import anyio
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Callable, TypeVar
+import database
+from aws_clients import AWS_MAX_POOL_CONNECTIONS
+'''
+Async repository over the DynamoDB and S3 helpers in database.py.
+Each call runs the pooled boto3 client in a worker thread, so the event loop
+never blocks. Calls share one limiter sized to the AWS connection pool, which
+bounds concurrency by available connections instead of Starlette's default
+threadpool.
+'''
+
+T = TypeVar('T')
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(AWS_MAX_POOL_CONNECTIONS)
+    return _limiter
+
+
+async def run_storage_call(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Runs a blocking storage call in a worker thread bounded by the AWS pool size.
+    """
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=get_limiter())
+
+
+async def upload_file_to_s3(file_content: bytes, s3_key: str, content_type: str) -> Optional[str]:
+    return await run_storage_call(database.upload_file_to_s3, file_content, s3_key, content_type)
+
+
+async def upload_fileobj_to_s3(fileobj, s3_key: str, content_type: str, max_size: int) -> Optional[str]:
+    return await run_storage_call(database.upload_fileobj_to_s3, fileobj, s3_key, content_type, max_size)
+
+
+async def get_file_from_s3(s3_key: str) -> Optional[bytes]:
+    return await run_storage_call(database.get_file_from_s3, s3_key)
+
+
+async def get_file_stream_from_s3(
+    s3_key: str,
+    byte_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+    return await run_storage_call(database.get_file_stream_from_s3, s3_key, byte_range, if_none_match, if_modified_since)
+
+
+async def create_presigned_upload(
+    s3_key: str,
+    content_type: str,
+    max_size: int,
+    expires_in: int
+    ) -> Optional[Dict[str, Any]]:
+    return await run_storage_call(database.create_presigned_upload, s3_key, content_type, max_size, expires_in)
+
+
+async def create_presigned_download_url(s3_key: str, expires_in: int) -> Optional[str]:
+    return await run_storage_call(database.create_presigned_download_url, s3_key, expires_in)
+
+
+async def get_file_metadata_from_s3(s3_key: str) -> Optional[Dict[str, Any]]:
+    return await run_storage_call(database.get_file_metadata_from_s3, s3_key)
+
+
+async def create_new_friend(
+    data: Dict[str, Any],
+    filename: str,
+    friend_id: Optional[str] = None,
+    owner_id: Optional[str] = None,
+    only_if_new: bool = False
+    ) -> Dict[str, Any]:
+    return await run_storage_call(database.create_new_friend, data, filename, friend_id, owner_id, only_if_new)
+
+
+async def batch_create_friends(items: List[Dict[str, Any]]) -> List[str]:
+    return await run_storage_call(database.batch_create_friends, items)
+
+
+async def get_one_friend(friend_id: str) -> Optional[Dict[str, Any]]:
+    return await run_storage_call(database.get_one_friend, friend_id)
+
+
+async def set_telegram_file_id(friend_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+    return await run_storage_call(database.set_telegram_file_id, friend_id, file_id)
+
+
+async def get_friends_by_ids(friend_ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    return await run_storage_call(database.get_friends_by_ids, friend_ids)
+
+
+async def get_friends_page(
+    limit: int,
+    cursor: Optional[str] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    return await run_storage_call(database.get_friends_page, limit, cursor)
+
+
+async def get_owner_friends_page(
+    owner_id: str,
+    limit: int,
+    cursor: Optional[str] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    return await run_storage_call(database.get_owner_friends_page, owner_id, limit, cursor)
+
+
+async def get_all_owner_friends(owner_id: str) -> Optional[List[Dict[str, Any]]]:
+    return await run_storage_call(database.get_all_owner_friends, owner_id)
+
+
+async def get_friends_by_profession(
+    profession: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    keep: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    return await run_storage_call(database.get_friends_by_profession, profession, limit, cursor, keep)
+
+
+async def rebuild_search_index() -> bool:
+    return await run_storage_call(database.rebuild_search_index)
+
+
+async def open_similarity_index(rebuild: bool = False) -> bool:
+    return await run_storage_call(database.open_similarity_index, rebuild)
+
+
+async def get_all_friends() -> Optional[List[Dict[str, Any]]]:
+    return await run_storage_call(database.get_all_friends)
+
+
+async def delete_friend(friend_id: str) -> bool:
+    return await run_storage_call(database.delete_friend, friend_id)
+
+
+async def batch_delete_friends(friend_ids: List[str]) -> List[str]:
+    return await run_storage_call(database.batch_delete_friends, friend_ids)
+
+
+async def delete_file_from_s3(s3_key: str) -> bool:
+    return await run_storage_call(database.delete_file_from_s3, s3_key)
+
+
+async def delete_files_from_s3(s3_keys: List[str]) -> List[str]:
+    return await run_storage_call(database.delete_files_from_s3, s3_keys)
@@ -0,0 +1,88 @@
+import boto3
+import os
+import threading
+from botocore.config import Config
+from dotenv import load_dotenv
+
+load_dotenv()
+'''
+Process-wide AWS session and clients shared by every request handler.
+botocore clients are thread-safe, so a single pooled client serves the whole
+FastAPI threadpool instead of a new client (and TLS connection) per call.
+'''
+
+AWS_REGION = os.getenv('AWS_REGION', 'eu-north-1')
+
+# === Connection pool, keep-alive and timeout settings ===
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', 50))
+AWS_CONNECT_TIMEOUT = float(os.getenv('AWS_CONNECT_TIMEOUT', 3))
+AWS_READ_TIMEOUT = float(os.getenv('AWS_READ_TIMEOUT', 10))
+AWS_MAX_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', 3))
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def client_config() -> Config:
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={'max_attempts': AWS_MAX_ATTEMPTS, 'mode': 'standard'}
+    )
+
+
+def get_session() -> boto3.session.Session:
+    """
+    Returns the shared boto3 session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session(region_name=AWS_REGION)
+    return _session
+
+
+def get_client(service_name: str):
+    """
+    Returns the shared low-level client for `service_name` (e.g. 's3').
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = session.client(service_name, config=client_config())
+                _clients[service_name] = client
+    return client
+
+
+def get_resource(service_name: str):
+    """
+    Returns the shared resource for `service_name` (e.g. 'dynamodb').
+    Only stateless actions (get_item, put_item, scan, ...) are used on it,
+    and those go straight to its underlying thread-safe client.
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = session.resource(service_name, config=client_config())
+                _resources[service_name] = resource
+    return resource
+
+
+def get_s3_client():
+    return get_client('s3')
+
+
+def get_dynamodb_resource():
+    return get_resource('dynamodb')
@@ -0,0 +1,66 @@
+import os
+import time
+import argparse
+import boto3
+from botocore.stub import Stubber
+
+# Dummy credentials are enough: clients are built locally and calls are stubbed
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+from aws_clients import AWS_REGION, get_s3_client
+'''
+Microbenchmark of the per-request overhead of building a new boto3 S3 client
+(the old behaviour of every database helper) versus reusing the shared pooled
+client from aws_clients. S3 responses are stubbed, so no network is involved
+and the numbers isolate client construction and request preparation.
+
+    python bench_aws_clients.py --requests 200
+'''
+
+PUT_PARAMS = {'Bucket': 'bench-bucket', 'Key': 'bench/photo.jpg', 'Body': b'\xFF\xD8\xFF\xE0', 'ContentType': 'image/jpeg'}
+
+
+def stubbed_put(s3_client, stubber: Stubber) -> None:
+    stubber.add_response('put_object', {'ETag': '"bench"'}, PUT_PARAMS)
+    s3_client.put_object(**PUT_PARAMS)
+
+
+def bench_client_per_request(requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        s3_client = boto3.client('s3', region_name=AWS_REGION)
+        with Stubber(s3_client) as stubber:
+            stubbed_put(s3_client, stubber)
+    return time.perf_counter() - start
+
+
+def bench_shared_client(requests: int) -> float:
+    start = time.perf_counter()
+    s3_client = get_s3_client()
+    with Stubber(s3_client) as stubber:
+        for _ in range(requests):
+            stubbed_put(s3_client, stubber)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-request AWS client overhead')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    # Warm up imports and the botocore data loader before measuring
+    bench_client_per_request(2)
+    bench_shared_client(2)
+
+    before = bench_client_per_request(args.requests)
+    after = bench_shared_client(args.requests)
+
+    print(f'requests:                  {args.requests}')
+    print(f'new client per request:    {before / args.requests * 1000:.3f} ms/request')
+    print(f'shared pooled client:      {after / args.requests * 1000:.3f} ms/request')
+    print(f'speedup:                   {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
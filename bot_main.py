@@ -1,10 +1,18 @@
 import telegram
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from dotenv import load_dotenv
-import requests
+import asyncio
+import httpx
+import html
+import json
+import time
 import logging
 import os 
+from api_client import FriendsAPI
+from cache import TTLCache
+from bot_state import make_session_store
+from bot_webhook import BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, run_webhook
 
 # Load environment variables from .env
 load_dotenv()
@@ -14,11 +22,33 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 FASTAPI_URL = os.getenv('FASTAPI_URL') 
 BOT_ID = BOT_TOKEN.split(":")[0]
 
+# Shared pooled client for all calls to the backend
+api = FriendsAPI(FASTAPI_URL)
+
+# Minimum seconds between edits of a streaming AI answer
+AI_STREAM_EDIT_INTERVAL = 1.0
+
+# Max seconds to wait for the next piece of a streaming AI answer
+AI_STREAM_READ_TIMEOUT = 60.0
+
+# Friends shown per page and how long a fetched page is reused
+FRIENDS_PAGE_SIZE = int(os.getenv('FRIENDS_PAGE_SIZE', 5))
+FRIENDS_PAGE_TTL = float(os.getenv('FRIENDS_PAGE_TTL', 30))
+
+# Longest profession description shown in a list (keeps pages under Telegram's 4096 chars)
+LIST_DESCRIPTION_LIMIT = 300
+
+# Telegram accepts at most 10 photos per album
+MEDIA_GROUP_SIZE = 10
+
+# Recently fetched friend pages, keyed by (chat ID, user ID, cursor)
+friend_pages = TTLCache(max_size=1000, ttl=FRIENDS_PAGE_TTL)
+
 # Basic logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# Temporary in-memory user data storage
-user_data = {}
+# Per-user conversation sessions (state, friend draft, pending ID action)
+sessions = make_session_store()
 
 # Conversation states
 CHOOSING_ACTION = 0
@@ -40,7 +70,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def get_main_menu_keyboard():
     keyboard = [
         [InlineKeyboardButton(" Додати нового друга (POST)", callback_data='start_post')],
-        [InlineKeyboardButton("Показати всіх друзів (GET)", callback_data='show_all_friends')],
+        [InlineKeyboardButton("Показати моїх друзів (GET)", callback_data='show_all_friends')],
         [InlineKeyboardButton("Знайти друга за ID (GET)", callback_data='get_friend_by_id')],
         [InlineKeyboardButton("Видалити друга за ID (DELETE)", callback_data='delete_friend')],
         [InlineKeyboardButton("Запитати про професію (AI)", callback_data='ask_ai')]
@@ -66,7 +96,7 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=reply_markup
         )
 
-    context.user_data['state'] = CHOOSING_ACTION
+    await sessions.update(update.effective_user.id, state=CHOOSING_ACTION)
 
 
 # Handles all button clicks from the main menu
@@ -78,24 +108,35 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     
     # Start adding a new friend
     if data == 'start_post':
-        user_data[user_id] = {}
-        context.user_data['state'] = AWAITING_NAME
+        await sessions.update(user_id, state=AWAITING_NAME, draft={})
         await query.edit_message_text("Початок додавання друга. Введіть ім'я (Name):")
 
-    # Show all friends
+    # Show all friends, first page
     elif query.data == 'show_all_friends':
         await show_all_friends(update, context)
 
+    # Next/Prev page of the friends list
+    elif data.startswith('friends_page:'):
+        await show_friends_page(update, context, int(data.split(':', 1)[1]))
+
+    # Photos of the friends on a list page
+    elif data.startswith('friends_photos:'):
+        await show_friends_photos(update, context, int(data.split(':', 1)[1]))
+
+    # Back to the main menu
+    elif data == 'main_menu':
+        await sessions.update(user_id, state=CHOOSING_ACTION)
+        await query.message.reply_text("Оберіть, яку дію ви хочете виконати з бекендом:", reply_markup=get_main_menu_keyboard())
+
     # Search for a friend by ID
     elif data == 'get_friend_by_id':
-        context.user_data['state'] = AWAITING_FRIEND_ID
+        await sessions.update(user_id, state=AWAITING_FRIEND_ID)
         await query.edit_message_text("Введіть, будь ласка, <b>FriendID</b> друга, якого ви хочете знайти:",
                                       parse_mode=telegram.constants.ParseMode.HTML)
 
     # Delete a friend by ID
     elif data == 'delete_friend':
-        context.user_data['next_action'] = 'delete_friend_action'  # Flag for delete mode
-        context.user_data['state'] = AWAITING_FRIEND_ID
+        await sessions.update(user_id, state=AWAITING_FRIEND_ID, next_action='delete_friend_action')  # Flag for delete mode
         await query.edit_message_text(
             "Щоб видалити друга, введіть <b>FriendID</b>:",
             parse_mode=telegram.constants.ParseMode.HTML
@@ -103,8 +144,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
 
     # Ask AI about a friend’s profession
     elif data == 'ask_ai':
-        context.user_data['next_action'] = 'ask_ai_question' 
-        context.user_data['state'] = AWAITING_FRIEND_ID 
+        await sessions.update(user_id, state=AWAITING_FRIEND_ID, next_action='ask_ai_question')
         await query.edit_message_text(
             "Щоб поставити запитання, спершу введіть <b>FriendID</b> друга:",
             parse_mode=telegram.constants.ParseMode.HTML
@@ -114,38 +154,45 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
 # Handles user text messages and route them depending on current state
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    state = context.user_data.get('state')
+    session = await sessions.get(user_id)
+    state = session['state']
     
     # Step 1 — get name
     if state == AWAITING_NAME:
-        user_data[user_id]['name'] = update.message.text
-        context.user_data['state'] = AWAITING_PROFESSION
+        session['draft']['name'] = update.message.text
+        session['state'] = AWAITING_PROFESSION
+        await sessions.save(user_id, session)
         await update.message.reply_text("Добре. Тепер введіть професію (Profession):")
     
     # Step 2 — get profession
     elif state == AWAITING_PROFESSION:
-        user_data[user_id]['profession'] = update.message.text
-        context.user_data['state'] = AWAITING_DESCRIPTION
+        session['draft']['profession'] = update.message.text
+        session['state'] = AWAITING_DESCRIPTION
+        await sessions.save(user_id, session)
         await update.message.reply_text("Чудово. Введіть короткий опис професії (Profession Description):")
 
     # Step 3 — get profession description
     elif state == AWAITING_DESCRIPTION:
-        user_data[user_id]['profession_description'] = update.message.text
-        context.user_data['state'] = AWAITING_PHOTO
+        session['draft']['profession_description'] = update.message.text
+        session['state'] = AWAITING_PHOTO
+        await sessions.save(user_id, session)
         await update.message.reply_text("Завершальний крок: Надішліть фотографію друга (стиснене або як документ):")
 
     # Step 4 — get photo and send to FastAPI
     elif state == AWAITING_PHOTO:
-        await process_photo(update, context)
+        await process_photo(update, context, session['draft'])
 
     # Handle Friend ID inputs for GET/DELETE/AI
     elif state == AWAITING_FRIEND_ID:
         friend_id = update.message.text.strip()
-        next_action = context.user_data.pop('next_action', 'get_friend_details') 
+        next_action = session['next_action'] or 'get_friend_details'
+        session['next_action'] = None
+        if next_action == 'ask_ai_question':
+            session['ai_friend_id'] = friend_id
+            session['state'] = AWAITING_AI_QUESTION
+        await sessions.save(user_id, session)
         
         if next_action == 'ask_ai_question':
-            context.user_data['ai_friend_id'] = friend_id
-            context.user_data['state'] = AWAITING_AI_QUESTION
             await update.message.reply_text(f"ID <code>{friend_id}</code> прийнято. Тепер введіть ваше запитання про професію друга:",
                                             parse_mode=telegram.constants.ParseMode.HTML)
 
@@ -158,76 +205,218 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Handle AI question input
     elif state == AWAITING_AI_QUESTION:
         question = update.message.text
-        friend_id = context.user_data.pop('ai_friend_id', None) 
+        friend_id = session['ai_friend_id']
+        session['ai_friend_id'] = None
+        await sessions.save(user_id, session)
         
         if friend_id:
             await process_ai_question(update, context, friend_id, question)
         else:
             await update.message.reply_text("Помилка: Не знайдено ID друга для AI-запиту. Спробуйте знову.")
-            context.user_data['state'] = CHOOSING_ACTION
             await main_menu(update, context)
             
     else:
         await update.message.reply_text("Будь ласка, оберіть дію за допомогою кнопок або наберіть /start.")
 
 
-# Fetch and display all friends from FastAPI
-async def show_all_friends(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.effective_message.reply_text("Запитую список всіх друзів з FastAPI...")
+# Fetch one page of a user's own friends (or reuse it while it is fresh)
+async def fetch_friends_page(chat_id: int, owner_id: int, cursor):
+    key = (chat_id, owner_id, cursor)
+    page = friend_pages.get(key)
+    if page is None:
+        params = {'owner': str(owner_id), 'limit': FRIENDS_PAGE_SIZE}
+        if cursor:
+            params['cursor'] = cursor
+        response = await api.request('GET', params=params)
+        response.raise_for_status()
+        body = response.json()
+        page = (body['items'], body.get('next_cursor'))
+        friend_pages.set(key, page)
+    return page
+
+
+# Format one page of friends with Prev/Next navigation
+def format_friends_page(friends_list, page: int, has_next: bool):
+    messages = []
+    for i, friend in enumerate(friends_list):
+        description = friend.get('ProfessionDescription', 'N/A')
+        if len(description) > LIST_DESCRIPTION_LIMIT:
+            description = description[:LIST_DESCRIPTION_LIMIT] + '…'
+        message = (
+            f"<b> Друг #{page * FRIENDS_PAGE_SIZE + i + 1}</b>\n"
+            f"<b>ID:</b> <code>{friend.get('FriendID')}</code>\n"
+            f"<b>Ім'я:</b> <code>{html.escape(friend.get('Name', ''))}</code>\n"
+            f"<b>Професія:</b> <code>{html.escape(friend.get('Profession', ''))}</code>\n"
+            f"<b>Опис:</b> <code>{html.escape(description)}</code>\n"
+            f"<b>S3Key:</b> <code>{html.escape(friend.get('S3Key', ''))}</code>\n"
+            f"<b>Посилання на Фото:</b> <a href='{html.escape(friend.get('PhotoUrl', ''))}'>Показати Фото (S3)</a>"
+        )
+        messages.append(message)
+
+    text = f"<b>Список Друзів — сторінка {page + 1}:</b>\n\n" + "\n\n— — —\n\n".join(messages)
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀ Назад", callback_data=f'friends_page:{page - 1}'))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Далі ▶", callback_data=f'friends_page:{page + 1}'))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("Фото сторінки", callback_data=f'friends_photos:{page}')])
+    keyboard.append([InlineKeyboardButton("Головне меню", callback_data='main_menu')])
+    return text, InlineKeyboardMarkup(keyboard)
+
 
+# Where Telegram can get a friend's photo: the remembered file_id, or a short-lived S3 link
+async def friend_photo_source(friend: dict, use_file_id: bool = True):
+    if use_file_id and friend.get('TelegramFileID'):
+        return friend['TelegramFileID']
     try:
-        response = requests.get(FASTAPI_URL)
+        response = await api.request(
+            'GET', f"/{friend['FriendID']}/photo", params={'size': 'medium', 'redirect': 'true'}, follow_redirects=False
+        )
+    except httpx.HTTPError as e:
+        logging.error(f"Could not get photo link for {friend['FriendID']}: {e}")
+        return None
+    return response.headers.get('location') if response.status_code == 307 else None
+
+
+# Store the file_id Telegram assigned to a newly sent photo, so later views re-send it for free
+async def remember_photo_file_id(friend: dict, sent_message):
+    if friend.get('TelegramFileID') or not sent_message.photo:
+        return
+    file_id = sent_message.photo[-1].file_id
+    friend['TelegramFileID'] = file_id
+    try:
+        response = await api.request('PUT', f"/{friend['FriendID']}/telegram_file", json={'file_id': file_id})
         response.raise_for_status()
-        friends_list = response.json() 
+    except httpx.HTTPError as e:
+        logging.error(f"Could not store Telegram file_id for {friend['FriendID']}: {e}")
+
+
+# Send one friend's photo, falling back to the S3 link if the stored file_id is rejected
+async def send_friend_photo(message, friend: dict):
+    caption = f"<b>{html.escape(friend.get('Name', ''))}</b>"
+    for use_file_id in (True, False):
+        source = await friend_photo_source(friend, use_file_id)
+        if not source:
+            return
+        try:
+            sent = await message.reply_photo(source, caption=caption, parse_mode=telegram.constants.ParseMode.HTML)
+        except telegram.error.BadRequest as e:
+            logging.error(f"Telegram rejected photo of {friend['FriendID']}: {e}")
+            if not use_file_id or not friend.pop('TelegramFileID', None):
+                return
+            continue
+        await remember_photo_file_id(friend, sent)
+        return
+
+
+# Send friends' photos as albums of up to 10, one photo at a time if an album is rejected
+async def send_friend_photos(message, friends: list):
+    for start in range(0, len(friends), MEDIA_GROUP_SIZE):
+        batch = friends[start:start + MEDIA_GROUP_SIZE]
+        try:
+            media = []
+            for friend in batch:
+                source = await friend_photo_source(friend)
+                if source:
+                    caption = f"<b>{html.escape(friend.get('Name', ''))}</b>"
+                    media.append((friend, InputMediaPhoto(source, caption=caption, parse_mode=telegram.constants.ParseMode.HTML)))
+            if len(media) < 2:
+                for friend, _ in media:
+                    await send_friend_photo(message, friend)
+                continue
+
+            sent_messages = await message.reply_media_group([item for _, item in media])
+            for (friend, _), sent in zip(media, sent_messages):
+                await remember_photo_file_id(friend, sent)
+        except telegram.error.BadRequest as e:
+            logging.error(f"Telegram rejected photo album: {e}")
+            for friend in batch:
+                await send_friend_photo(message, friend)
+
+
+# Show the photos of the friends on one list page
+async def show_friends_photos(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    session = await sessions.get(update.effective_user.id)
+    cursors = [None] + session['friend_cursors']
+    if page >= len(cursors):
+        page = 0
+    try:
+        friends_list, _ = await fetch_friends_page(update.effective_chat.id, update.effective_user.id, cursors[page])
+    except httpx.HTTPError as e:
+        error_message = f"Помилка з'єднання з FastAPI: {e}"
+        logging.error(error_message)
+        await update.effective_message.reply_text(error_message)
+        return
+    await send_friend_photos(update.effective_message, friends_list)
+
+
+# Show the first page of friends from FastAPI
+async def show_all_friends(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.effective_message.reply_text("Запитую список друзів з FastAPI...")
+
+    # Start a fresh listing: page N is reached with cursor N (page 0 needs none)
+    await sessions.update(update.effective_user.id, friend_cursors=[])
+    friend_pages.delete((update.effective_chat.id, update.effective_user.id, None))
+    await show_friends_page(update, context, 0)
+
+
+# Show one page of friends; edits the list message when navigating
+async def show_friends_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+    session = await sessions.get(user_id)
+    cursors = [None] + session['friend_cursors']
+    navigating = update.callback_query is not None and update.callback_query.data.startswith('friends_page:')
+
+    try:
+        # Pages beyond the known cursors (e.g. after a restart) start over
+        if page >= len(cursors):
+            page = 0
+        friends_list, next_cursor = await fetch_friends_page(chat_id, user_id, cursors[page])
+        if next_cursor and len(cursors) == page + 1:
+            await sessions.update(user_id, friend_cursors=session['friend_cursors'] + [next_cursor])
         
         # Handle empty database
-        if not friends_list:
+        if not friends_list and page == 0:
             await update.effective_message.reply_text(
-                " На жаль, у базі даних немає жодного друга.",
-                reply_markup=main_menu(update, context)
+                " На жаль, у вас ще немає жодного друга.",
+                reply_markup=get_main_menu_keyboard()
             )
             return
 
-        # Format all friends into one message
-        messages = []
-        for i, friend in enumerate(friends_list):
-            message = (
-                f"<b> Друг #{i + 1}</b>\n"
-                f"<b>ID:</b> <code>{friend.get('FriendID')}</code>\n"
-                f"<b>Ім'я:</b> <code>{friend.get('Name')}</code>\n"
-                f"<b>Професія:</b> <code>{friend.get('Profession')}</code>\n"
-                f"<b>Опис:</b> <code>{friend.get('ProfessionDescription', 'N/A')}</code>\n"
-                f"<b>S3Key:</b> <code>{friend.get('S3Key')}</code>\n"
-                f"<b>Посилання на Фото:</b> <a href='{friend.get('PhotoUrl')}'>Показати Фото (S3)</a>"
+        text, reply_markup = format_friends_page(friends_list, page, bool(next_cursor))
+        if navigating:
+            await update.callback_query.edit_message_text(
+                text,
+                parse_mode=telegram.constants.ParseMode.HTML,
+                disable_web_page_preview=True,
+                reply_markup=reply_markup
+            )
+        else:
+            await update.effective_message.reply_text(
+                text,
+                parse_mode=telegram.constants.ParseMode.HTML,
+                disable_web_page_preview=True,
+                reply_markup=reply_markup
             )
-            messages.append(message)
-
-        final_message = "<b>Список Усіх Друзів:</b>\n\n" + "\n\n— — —\n\n".join(messages)
-        
-        await update.effective_message.reply_text(
-            final_message,
-            parse_mode=telegram.constants.ParseMode.HTML,
-            disable_web_page_preview=True
-        )
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Handle connection errors
         error_message = f"Помилка з'єднання з FastAPI: {e}"
         logging.error(error_message)
-        await update.effective_message.reply_text(error_message)
+        await update.effective_message.reply_text(error_message, reply_markup=get_main_menu_keyboard())
         
     except Exception as e:
         # Handle unexpected issues
         error_message = f"Виникла несподівана помилка під час отримання даних: {e}"
         logging.error(error_message)
-        await update.effective_message.reply_text(error_message)
-        
-
-    await update.effective_message.reply_text("Що ви хочете зробити далі?", reply_markup=get_main_menu_keyboard())
+        await update.effective_message.reply_text(error_message, reply_markup=get_main_menu_keyboard())
 
 
 # Handle sending photo and posting new friend to FastAPI
-async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict):
     user_id = update.effective_user.id
     
     # Accept either compressed photo or image document
@@ -242,14 +431,9 @@ async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Фото отримано. Відправляю дані на FastAPI...")
     
     try:
-        # Download the image file from Telegram servers
+        # Locate the image file on Telegram servers
         telegram_file = await file_to_download.get_file()
         file_url = telegram_file.file_path
-        file_content_response = requests.get(file_url)
-        file_content_response.raise_for_status()
-        file_content = file_content_response.content
-        
-        data = user_data[user_id] 
         
         # Determine file type
         if update.message.document:
@@ -258,12 +442,11 @@ async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             mime_type = 'image/jpeg' 
         
         file_name = f"{user_id}_{file_to_download.file_unique_id}.jpg"
-        files = {
-        'photo': (file_name, file_content, mime_type) 
-        }
 
-        # POST request to FastAPI
-        response = requests.post(FASTAPI_URL, data=data, files=files)
+        # Relay the download straight into the POST to FastAPI, chunk by chunk
+        response = await api.relay_file(
+            file_url, '', data, 'photo', file_name, mime_type, headers={'X-Owner-ID': str(user_id)}
+        )
         response.raise_for_status() 
         response_data = response.json()
 
@@ -279,15 +462,14 @@ async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"<b>Посилання на Фото:</b> <a href='{response_data.get('PhotoUrl')}'>Показати Фото (S3)</a>"
         )
         
-        # Clear temporary user data
-        context.user_data.clear()
-        del user_data[user_id]
+        # Clear the finished draft
+        await sessions.delete(user_id)
         await update.message.reply_text(
             formatted_response,
             parse_mode=telegram.constants.ParseMode.HTML
         )
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Handle HTTP-specific errors
         try:
             error_detail = e.response.json().get('detail', 'Невідома помилка HTTP')
@@ -302,7 +484,7 @@ async def process_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Виникла несподівана помилка: {e}")
         logging.error(f"General error: {e}")
 
-    context.user_data['state'] = CHOOSING_ACTION
+    await sessions.update(update.effective_user.id, state=CHOOSING_ACTION)
     await update.effective_message.reply_text("Що ви хочете зробити далі?", reply_markup=get_main_menu_keyboard())
 
 
@@ -311,10 +493,8 @@ async def process_get_friend_by_id(update: Update, context: ContextTypes.DEFAULT
     await update.message.reply_text(f"Шукаю друга з ID: <code>{friend_id}</code>...", 
                                     parse_mode=telegram.constants.ParseMode.HTML)
     
-    API_URL_WITH_ID = f"{FASTAPI_URL}/{friend_id}"
-
     try:
-        response = requests.get(API_URL_WITH_ID)
+        response = await api.request('GET', f"/{friend_id}")
         response.raise_for_status() 
         friend_data = response.json() 
 
@@ -334,8 +514,9 @@ async def process_get_friend_by_id(update: Update, context: ContextTypes.DEFAULT
             formatted_response,
             parse_mode=telegram.constants.ParseMode.HTML
         )
+        await send_friend_photo(update.message, friend_data)
         
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Handle HTTP 404 or 500
         error_detail = e.response.json().get('detail', e.response.text)
         await update.message.reply_text(f"Помилка (4xx/5xx): Не вдалося знайти друга або інша помилка: {error_detail}")
@@ -345,7 +526,7 @@ async def process_get_friend_by_id(update: Update, context: ContextTypes.DEFAULT
         await update.message.reply_text(f"Виникла несподівана помилка: {e}")
         logging.error(f"General error fetching ID {friend_id}: {e}")
 
-    context.user_data['state'] = CHOOSING_ACTION
+    await sessions.update(update.effective_user.id, state=CHOOSING_ACTION)
     await update.message.reply_text("Що ви хочете зробити далі?", reply_markup=get_main_menu_keyboard())
 
 
@@ -354,10 +535,8 @@ async def process_delete_friend(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text(f"Надсилаю запит на видалення друга з ID: <code>{friend_id}</code>...", 
                                     parse_mode=telegram.constants.ParseMode.HTML)
     
-    API_URL_WITH_ID = f"{FASTAPI_URL}/delete/{friend_id}" 
-    
     try:
-        response = requests.delete(API_URL_WITH_ID)
+        response = await api.request('DELETE', f"/delete/{friend_id}")
         
         if response.status_code == 200:
             await update.message.reply_text(
@@ -374,7 +553,7 @@ async def process_delete_friend(update: Update, context: ContextTypes.DEFAULT_TY
             await update.message.reply_text(f"Помилка видалення (HTTP {response.status_code}). Деталі: {error_detail}")
             logging.error(f"FastAPI error deleting ID {friend_id}: {error_detail}")
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_message = f"Помилка з'єднання з FastAPI: {e}"
         logging.error(error_message)
         await update.message.reply_text(f"{error_message}")
@@ -383,34 +562,59 @@ async def process_delete_friend(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text(f"Виникла несподівана помилка: {e}")
         logging.error(f"General error deleting ID {friend_id}: {e}")
 
-    context.user_data['state'] = CHOOSING_ACTION
+    await sessions.update(update.effective_user.id, state=CHOOSING_ACTION)
     await update.message.reply_text("Що ви хочете зробити далі?", reply_markup=get_main_menu_keyboard())
 
 
-# Send a question to FastAPI → LLM for AI answer
+# Send a question to FastAPI → LLM and show the AI answer as it streams in
 async def process_ai_question(update: Update, context: ContextTypes.DEFAULT_TYPE, friend_id: str, question: str):
-    await update.message.reply_text("Обробляю запитання за допомогою AI. Це може зайняти до 15 секунд...")
+    status_message = await update.message.reply_text("Обробляю запитання за допомогою AI...")
     
-    API_URL = f"{FASTAPI_URL}/{friend_id}/ask"
     payload = {"question": question}
+    timeout = httpx.Timeout(api.timeout, read=AI_STREAM_READ_TIMEOUT)
 
     try:
-        response = requests.post(API_URL, json=payload)
-        response.raise_for_status() 
-        ai_answer = response.json() 
+        answer = ''
+        shown = ''
+        last_edit = 0.0
+        async with api.stream('POST', f"/{friend_id}/ask/stream", json=payload, timeout=timeout) as response:
+            if response.status_code >= 400:
+                await response.aread()
+            response.raise_for_status()
+
+            event = 'message'
+            async for line in response.aiter_lines():
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                    continue
+                if not line.startswith('data:'):
+                    continue
+                data = json.loads(line[len('data:'):])
+                if event == 'error':
+                    raise RuntimeError(data.get('detail', 'AI stream error'))
+                if event == 'done':
+                    break
+
+                # Edit the reply at most once per interval to stay within Telegram limits
+                answer += data.get('delta', '')
+                now = time.monotonic()
+                if answer.strip() and answer != shown and now - last_edit >= AI_STREAM_EDIT_INTERVAL:
+                    await status_message.edit_text(answer + ' ▌')
+                    shown = answer
+                    last_edit = now
 
         formatted_response = (
             f"<b>Відповідь AI про професію друга:</b>\n"
             f"━━━━━━━━━━━━━━━━━━━\n"
-            f"<b>{ai_answer}</b>\n"
+            f"<b>{html.escape(answer.strip())}</b>\n"
         )
         
-        await update.message.reply_text(
+        await status_message.edit_text(
             formatted_response,
             parse_mode=telegram.constants.ParseMode.HTML
         )
         
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Handle backend AI-related HTTP errors
         try:
             error_detail = e.response.json().get('detail', 'Невідома помилка')
@@ -425,14 +629,26 @@ async def process_ai_question(update: Update, context: ContextTypes.DEFAULT_TYPE
         logging.error(f"General error AI processing: {e}")
 
 
-    context.user_data['state'] = CHOOSING_ACTION
+    await sessions.update(update.effective_user.id, state=CHOOSING_ACTION)
     await update.message.reply_text("Що ви хочете зробити далі?", reply_markup=get_main_menu_keyboard())
 
 
 
 
+# Close the shared backend client when the bot stops
+async def close_api_client(application: Application):
+    await api.aclose()
+
+
 def main():
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Handle updates from different chats concurrently
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_shutdown(close_api_client)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start_command))
     
@@ -443,6 +659,14 @@ def main():
         handle_message
     ))
     
+    # Webhook mode when configured, long polling otherwise
+    if BOT_MODE == 'webhook':
+        if WEBHOOK_URL and WEBHOOK_SECRET:
+            logging.info("Starting bot in webhook mode...")
+            asyncio.run(run_webhook(application))
+            return
+        logging.warning("BOT_MODE=webhook needs WEBHOOK_URL and WEBHOOK_SECRET, falling back to polling")
+
     logging.info("Starting bot...")
     application.run_polling(poll_interval=3)
 
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from cache import TTLCache
+
+load_dotenv()
+'''
+Conversation state of bot users: the current step, the friend draft being
+filled in, the pending ID action and the cursors of the friends list pages. Sessions are small JSON records keyed by
+Telegram user ID and expire when a user abandons a flow. The memory store is
+bounded (LRU + TTL); the SQLite store survives restarts and can be shared by
+several bot processes using the same file.
+'''
+
+BOT_STATE_BACKEND = os.getenv('BOT_STATE_BACKEND', 'memory').lower()
+BOT_STATE_PATH = os.getenv('BOT_STATE_PATH', 'bot_state.sqlite3')
+BOT_STATE_TTL = float(os.getenv('BOT_STATE_TTL', 24 * 3600))
+BOT_STATE_MAX_SESSIONS = int(os.getenv('BOT_STATE_MAX_SESSIONS', 10000))
+
+
+def new_session() -> Dict[str, Any]:
+    return {'state': 0, 'draft': {}, 'next_action': None, 'ai_friend_id': None, 'friend_cursors': []}
+
+
+def dump_session(session: Dict[str, Any]) -> Optional[str]:
+    """
+    Compact JSON of a session without its empty fields, or None for a
+    session with nothing left to remember.
+    """
+    compact = {key: value for key, value in session.items() if value}
+    return json.dumps(compact, ensure_ascii=False, separators=(',', ':')) if compact else None
+
+
+def load_session(raw: Optional[str]) -> Dict[str, Any]:
+    session = new_session()
+    if raw:
+        session.update(json.loads(raw))
+    return session
+
+
+class SessionStore(ABC):
+    """
+    Base class: subclasses store the compact JSON of each session.
+    """
+
+    @abstractmethod
+    async def _get_raw(self, user_id: int) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def _set_raw(self, user_id: int, raw: str) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, user_id: int) -> None:
+        ...
+
+    async def get(self, user_id: int) -> Dict[str, Any]:
+        """
+        Returns the user's session, or a new one if there is none.
+        """
+        return load_session(await self._get_raw(user_id))
+
+    async def save(self, user_id: int, session: Dict[str, Any]) -> None:
+        raw = dump_session(session)
+        if raw is None:
+            await self.delete(user_id)
+        else:
+            await self._set_raw(user_id, raw)
+
+    async def update(self, user_id: int, **fields: Any) -> Dict[str, Any]:
+        session = await self.get(user_id)
+        session.update(fields)
+        await self.save(user_id, session)
+        return session
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl: float = BOT_STATE_TTL, max_sessions: int = BOT_STATE_MAX_SESSIONS):
+        self.sessions = TTLCache(max_size=max_sessions, ttl=ttl)
+
+    async def _get_raw(self, user_id: int) -> Optional[str]:
+        return self.sessions.get(user_id)
+
+    async def _set_raw(self, user_id: int, raw: str) -> None:
+        self.sessions.set(user_id, raw)
+
+    async def delete(self, user_id: int) -> None:
+        self.sessions.delete(user_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite file (WAL mode). Queries run in a worker
+    thread so they never block the bot's event loop.
+    """
+
+    def __init__(self, path: str = BOT_STATE_PATH, ttl: float = BOT_STATE_TTL, max_sessions: int = BOT_STATE_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _get_sync(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT data FROM sessions WHERE user_id = ? AND updated_at >= ?',
+                (user_id, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set_sync(self, user_id: int, raw: str) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)',
+                (user_id, raw, now)
+            )
+            # Drop abandoned sessions, then the least recently active ones above the limit
+            connection.execute('DELETE FROM sessions WHERE updated_at < ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM sessions WHERE user_id IN '
+                '(SELECT user_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_sessions,)
+            )
+            connection.commit()
+
+    def _delete_sync(self, user_id: int) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+            connection.commit()
+
+    async def _get_raw(self, user_id: int) -> Optional[str]:
+        return await asyncio.to_thread(self._get_sync, user_id)
+
+    async def _set_raw(self, user_id: int, raw: str) -> None:
+        await asyncio.to_thread(self._set_sync, user_id, raw)
+
+    async def delete(self, user_id: int) -> None:
+        await asyncio.to_thread(self._delete_sync, user_id)
+
+
+def make_session_store(backend: str = BOT_STATE_BACKEND) -> SessionStore:
+    """
+    Returns a SQLiteSessionStore for backend "sqlite", otherwise the in-memory store.
+    """
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    return MemorySessionStore()
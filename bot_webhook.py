@@ -0,0 +1,133 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import uvicorn
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+load_dotenv()
+'''
+Webhook receiver for the Telegram bot: a small Starlette app that accepts
+updates from Telegram, checks the secret token header and puts each update on
+a bounded queue drained by worker tasks calling application.process_update.
+When the queue is full the receiver answers 503 and Telegram retries later.
+'''
+
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 100))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 8))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookReceiver:
+    def __init__(
+        self,
+        application: Application,
+        secret: str,
+        path: str = WEBHOOK_PATH,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        workers: int = WEBHOOK_WORKERS
+        ):
+        self.application = application
+        self.secret = secret
+        self.path = path
+        self.queue_size = queue_size
+        self.workers = workers
+        self.received = 0
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        Lets the workers finish the queued updates, then stops them.
+        """
+        if self._tasks:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.application.process_update(update)
+            except Exception as e:
+                logging.error(f'Error processing update {update.update_id}: {e}')
+            finally:
+                self._queue.task_done()
+
+    async def handle(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode('utf-8'), self.secret.encode('utf-8')):
+            return Response(status_code=403)
+
+        try:
+            update = Update.de_json(json.loads(await request.body()), self.application.bot)
+        except Exception as e:
+            logging.error(f'Invalid webhook update: {e}')
+            return Response(status_code=400)
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logging.warning(f'Webhook queue full, rejecting update {update.update_id}')
+            return Response(status_code=503)
+        self.received += 1
+        return Response(status_code=200)
+
+    def asgi_app(self) -> Starlette:
+        @asynccontextmanager
+        async def lifespan(app: Starlette):
+            await self.start()
+            try:
+                yield
+            finally:
+                await self.stop()
+
+        return Starlette(routes=[Route(self.path, self.handle, methods=['POST'])], lifespan=lifespan)
+
+
+async def run_webhook(application: Application) -> None:
+    """
+    Registers the webhook with Telegram and serves the receiver until stopped.
+    """
+    receiver = WebhookReceiver(application, WEBHOOK_SECRET)
+    server = uvicorn.Server(uvicorn.Config(receiver.asgi_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT, log_level='warning'))
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logging.info(f'Webhook receiver listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}')
+        try:
+            await server.serve()
+        finally:
+            if application.post_shutdown:
+                await application.post_shutdown(application)
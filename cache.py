@@ -0,0 +1,158 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Hashable, Optional
+'''
+Small caches shared by the API and the bot: a bounded in-process LRU cache
+with per-entry TTL, and an optional Redis backend with the same interface so
+several uvicorn workers can share entries. A Redis outage degrades to cache
+misses: callers fall back to the source of truth instead of failing.
+'''
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache holding at most `max_size` entries, each valid for
+    `ttl` seconds. Counts hits and misses.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'memory',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl
+        }
+
+
+def encode_decimal(value: Any) -> Any:
+    """
+    JSON default for DynamoDB numbers, which boto3 returns as Decimal.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class RedisCache:
+    """
+    Redis-backed cache with the TTLCache interface, shared by every process
+    using the same Redis URL. Values are stored as JSON under `prefix`;
+    numbers come back as Decimal, like DynamoDB items read through boto3.
+    Eviction is left to Redis (TTL plus its maxmemory policy). Redis errors
+    are logged and counted, never raised: get() misses, set() and delete()
+    are skipped (a missed delete leaves a stale entry until its TTL).
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: float = 60):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('Redis cache backend requires the "redis" package') from e
+        self.client = redis.Redis.from_url(url)
+        self.redis_error = redis.RedisError
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f'{self.prefix}:{key}'
+
+    def _failed(self, action: str, key: Hashable, error: Exception) -> None:
+        self.errors += 1
+        logging.error(f'Redis cache {action} failed for {self._key(key)}: {error}')
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        try:
+            raw = self.client.get(self._key(key))
+        except self.redis_error as e:
+            self._failed('get', key, e)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw, parse_float=Decimal, parse_int=Decimal)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        try:
+            self.client.set(self._key(key), json.dumps(value, default=encode_decimal), px=int(self.ttl * 1000))
+        except (self.redis_error, TypeError, ValueError) as e:
+            self._failed('set', key, e)
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self.client.delete(self._key(key))
+        except self.redis_error as e:
+            self._failed('delete', key, e)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=f'{self.prefix}:*'):
+            self.client.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'redis',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'errors': self.errors,
+            'ttl': self.ttl
+        }
+
+
+def make_cache(prefix: str, max_size: int, ttl: float, url: Optional[str] = None):
+    """
+    Returns a RedisCache when `url` is a redis:// URL, otherwise an in-process TTLCache.
+    """
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, prefix=prefix, ttl=ttl)
+    return TTLCache(max_size=max_size, ttl=ttl)
@@ -1,30 +1,86 @@
-import boto3
 import uuid
 import json
+import base64
 import logging
 import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
-from typing import Optional, Dict, Any, List
+from typing import Optional, Callable, Dict, Any, List, Tuple, Iterator, Sequence
 from dotenv import load_dotenv
+from aws_clients import AWS_REGION, get_dynamodb_resource, get_s3_client
+from cache import make_cache
+from search_index import normalize_profession, search_index
+from similarity_index import similarity_index
 
 load_dotenv()
-AWS_REGION = "eu-north-1"
 
-# Initialize DynamoDB resource
-dynamo_db = boto3.resource(
-    "dynamodb",
-    region_name=AWS_REGION
-)
+# Initialize DynamoDB resource (shared, pooled; see aws_clients)
+dynamo_db = get_dynamodb_resource()
 
 TABLE_NAME = os.getenv('TABLE_NAME')
-dynamo_db = boto3.resource("dynamodb")
 table = dynamo_db.Table(TABLE_NAME)
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 S3_FOLDER = os.getenv('S3_FOLDER')
+SCAN_SEGMENTS = int(os.getenv('SCAN_SEGMENTS', 4))
+
+# Global secondary index on OwnerID (created by migrate_indexes.py)
+OWNER_INDEX_NAME = os.getenv('OWNER_INDEX_NAME', 'OwnerIndex')
+
+# Global secondary index on ProfessionNorm, the normalized profession (created by migrate_indexes.py)
+PROFESSION_INDEX_NAME = os.getenv('PROFESSION_INDEX_NAME', 'ProfessionIndex')
+
+# Uploads larger than one part go through S3 multipart upload (S3 minimum part size is 5MB)
+S3_MULTIPART_PART_SIZE = int(os.getenv('S3_MULTIPART_PART_SIZE', 5 * 1024 * 1024))
+S3_UPLOAD_READ_SIZE = 256 * 1024
+
+# Read-through cache of friend records (FRIEND_CACHE_URL=redis://... shares it between workers)
+FRIEND_CACHE_SIZE = int(os.getenv('FRIEND_CACHE_SIZE', 10000))
+FRIEND_CACHE_TTL = float(os.getenv('FRIEND_CACHE_TTL', 300))
+friend_cache = make_cache('friend', FRIEND_CACHE_SIZE, FRIEND_CACHE_TTL, os.getenv('FRIEND_CACHE_URL'))
+
+# Similarity index writes (disk I/O, occasionally a full regrow) run on one
+# background thread, in order, so they never delay or fail a request
+similarity_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similarity-index')
+
+# DynamoDB batch limits and retry policy for unprocessed keys/items
+DYNAMODB_BATCH_GET_SIZE = 100
+DYNAMODB_BATCH_WRITE_SIZE = 25
+DYNAMODB_BATCH_MAX_RETRIES = 6
+DYNAMODB_BACKOFF_BASE = 0.05
+DYNAMODB_BACKOFF_CAP = 2.0
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 
+class FileTooLargeError(Exception):
+    """Raised when an uploaded file turns out to be larger than allowed."""
+
+
+class FriendExistsError(Exception):
+    """Raised when a friend that must be new already has a record."""
+
+
+# ============================
+# Friend IDs, S3 keys and photo URLs
+# ============================
+def new_friend_id() -> str:
+    return str(uuid.uuid4())
+
+
+def make_s3_key(friend_id: str, filename: str) -> str:
+    return f'{S3_FOLDER}/{friend_id}/{filename}'
+
+
+def make_photo_url(s3_key: str) -> str:
+    return f'https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}'
+
+
 # ============================
 # Upload file to AWS S3 bucket
 # ============================
@@ -34,19 +90,98 @@ def upload_file_to_s3(file_content: bytes, s3_key: str, content_type: str) -> Op
     Returns the public URL of the uploaded file or None on failure.
     """
     try:
-        s3_client = boto3.client('s3', region_name='eu-north-1')
+        s3_client = get_s3_client()
         s3_client.put_object(
             Bucket=S3_BUCKET_NAME,
             Key=s3_key,
             Body=file_content,
             ContentType=content_type
         )
-        return f'https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}'
+        return make_photo_url(s3_key)
     except Exception as e:
         logging.error(f'Error uploading file to S3 at {s3_key}: {e}')
         return None
 
 
+# ======================================
+# Stream a file object to AWS S3 with a size limit
+# ======================================
+def upload_fileobj_to_s3(
+    fileobj,
+    s3_key: str,
+    content_type: str,
+    max_size: int,
+    part_size: int = S3_MULTIPART_PART_SIZE
+    ) -> Optional[str]:
+    """
+    Uploads a file object to S3 while reading it in small chunks.
+    Files that fit in one part are sent with put_object. Larger files use a
+    multipart upload, so at most one part is held in memory at a time.
+    Raises FileTooLargeError as soon as more than `max_size` bytes have been
+    read (aborting any multipart upload). Returns the public URL or None on failure.
+    """
+    received = 0
+
+    def read_part() -> bytes:
+        nonlocal received
+        part = bytearray()
+        while len(part) < part_size:
+            chunk = fileobj.read(min(S3_UPLOAD_READ_SIZE, part_size - len(part)))
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > max_size:
+                raise FileTooLargeError(f'File at {s3_key} exceeds {max_size} bytes')
+            part.extend(chunk)
+        return bytes(part)
+
+    try:
+        s3_client = get_s3_client()
+        part = read_part()
+        if len(part) < part_size:
+            s3_client.put_object(
+                Bucket=S3_BUCKET_NAME,
+                Key=s3_key,
+                Body=part,
+                ContentType=content_type
+            )
+            return make_photo_url(s3_key)
+
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            ContentType=content_type
+        )['UploadId']
+        try:
+            parts = []
+            while part:
+                response = s3_client.upload_part(
+                    Bucket=S3_BUCKET_NAME,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=len(parts) + 1,
+                    Body=part
+                )
+                parts.append({'ETag': response['ETag'], 'PartNumber': len(parts) + 1})
+                part = read_part()
+
+            s3_client.complete_multipart_upload(
+                Bucket=S3_BUCKET_NAME,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return make_photo_url(s3_key)
+        except BaseException:
+            s3_client.abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+            raise
+    except FileTooLargeError:
+        raise
+    except Exception as e:
+        logging.error(f'Error streaming file to S3 at {s3_key}: {e}')
+        return None
+
+
 # ======================================
 # Retrieve a photo file from AWS S3 by key
 # ======================================
@@ -56,7 +191,7 @@ def get_file_from_s3(s3_key: str) -> Optional[bytes]:
     Returns the file bytes or None if the file is not found or on error.
     """
     try:
-        s3_client = boto3.client('s3', region_name=AWS_REGION)
+        s3_client = get_s3_client()
         response = s3_client.get_object(
             Bucket=S3_BUCKET_NAME,
             Key=s3_key
@@ -75,69 +210,553 @@ def get_file_from_s3(s3_key: str) -> Optional[bytes]:
 
 
 # ======================================
-# Create a new friend record in DynamoDB
+# Open a photo file from AWS S3 as a stream
 # ======================================
-def create_new_friend(
-    data: Dict[str, Any],
-    filename: str
-    ) -> Dict[str, Any]:
+def get_file_stream_from_s3(
+    s3_key: str,
+    byte_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
     """
-    Creates a new record (friend) in DynamoDB and constructs S3 file metadata.
-    Generates a UUID for the friend and stores S3 URL.
+    Opens a file (photo) in S3 without reading it, optionally for a byte range
+    and conditionally on If-None-Match / If-Modified-Since.
+    Returns the get_object response with an added 'StatusCode' (200 or 206;
+    the caller must close 'Body'), {'StatusCode': 304 | 412 | 416} when S3
+    answers the condition or range itself, or None if the file is not found.
+    """
+    request: Dict[str, Any] = {'Bucket': S3_BUCKET_NAME, 'Key': s3_key}
+    if byte_range:
+        request['Range'] = byte_range
+    if if_none_match:
+        request['IfNoneMatch'] = if_none_match
+    elif if_modified_since:
+        request['IfModifiedSince'] = if_modified_since
+
+    try:
+        response = get_s3_client().get_object(**request)
+        response['StatusCode'] = response['ResponseMetadata']['HTTPStatusCode']
+        return response
+    except ClientError as e:
+        status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status_code in (304, 412, 416):
+            headers = e.response['ResponseMetadata'].get('HTTPHeaders', {})
+            return {'StatusCode': status_code, 'ETag': headers.get('etag')}
+        logging.error(f'S3 file not found for key: {s3_key}: {e}')
+        return None
+    except Exception as e:
+        logging.error(f'Error opening file from S3 at {s3_key}: {e}')
+        return None
+
+
+# ======================================
+# Presigned S3 upload form and download URL
+# ======================================
+def create_presigned_upload(
+    s3_key: str,
+    content_type: str,
+    max_size: int,
+    expires_in: int
+    ) -> Optional[Dict[str, Any]]:
+    """
+    Creates a presigned S3 POST form so a client can upload a photo directly.
+    S3 itself enforces the exact Content-Type and a 1..max_size byte length.
+    Returns {'url': ..., 'fields': {...}} or None on failure.
+    """
+    try:
+        return get_s3_client().generate_presigned_post(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size]
+            ],
+            ExpiresIn=expires_in
+        )
+    except Exception as e:
+        logging.error(f'Error presigning S3 upload for {s3_key}: {e}')
+        return None
+
+
+def create_presigned_download_url(s3_key: str, expires_in: int) -> Optional[str]:
+    """
+    Creates a short-lived presigned GET URL for a file in S3.
+    Returns the URL or None on failure.
     """
-    s3_client = boto3.client('s3', region_name=AWS_REGION)
+    try:
+        return get_s3_client().generate_presigned_url(
+            'get_object',
+            Params={'Bucket': S3_BUCKET_NAME, 'Key': s3_key},
+            ExpiresIn=expires_in
+        )
+    except Exception as e:
+        logging.error(f'Error presigning S3 download for {s3_key}: {e}')
+        return None
 
-    friend_id = str(uuid.uuid4())
-    s3_key = f'{S3_FOLDER}/{friend_id}/{filename}'
-    photo_url = f'https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}'
 
-    item: Dict[str, Any] = {
+# ======================================
+# Read photo file metadata from AWS S3
+# ======================================
+def get_file_metadata_from_s3(s3_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the head_object metadata (ContentLength, ContentType, ETag, ...)
+    of a file in S3, or None if it does not exist or on error.
+    """
+    try:
+        return get_s3_client().head_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+    except ClientError as e:
+        logging.error(f'S3 file not found for key: {s3_key}: {e}')
+        return None
+    except Exception as e:
+        logging.error(f'Error reading file metadata from S3 at {s3_key}: {e}')
+        return None
+
+
+# ======================================
+# Build a friend record (without storing it)
+# ======================================
+def build_friend_item(
+    data: Dict[str, Any],
+    filename: str,
+    friend_id: str,
+    owner_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+    s3_key = make_s3_key(friend_id, filename)
+    item = {
         'FriendID': friend_id,
         'Name': data['Name'],
         'Profession': data['Profession'],
         'ProfessionDescription': data['ProfessionDescription'],
         'S3Key': s3_key,
-        'PhotoUrl': photo_url
+        'PhotoUrl': make_photo_url(s3_key)
     }
+    # DynamoDB rejects an empty index key, so blank professions stay out of the index
+    profession_norm = normalize_profession(data['Profession'])
+    if profession_norm:
+        item['ProfessionNorm'] = profession_norm
+    if owner_id:
+        item['OwnerID'] = owner_id
+    return item
+
+
+# ======================================
+# Create a new friend record in DynamoDB
+# ======================================
+def create_new_friend(
+    data: Dict[str, Any],
+    filename: str,
+    friend_id: Optional[str] = None,
+    owner_id: Optional[str] = None,
+    only_if_new: bool = False
+    ) -> Dict[str, Any]:
+    """
+    Creates a new record (friend) in DynamoDB and constructs S3 file metadata.
+    Generates a UUID for the friend (unless one is given) and stores S3 URL.
+    With `only_if_new`, raises FriendExistsError instead of overwriting a record.
+    """
+    friend_id = friend_id or new_friend_id()
+    item = build_friend_item(data, filename, friend_id, owner_id)
 
     try:
-        table.put_item(Item=item)
-        return item
+        if only_if_new:
+            table.put_item(Item=item, ConditionExpression='attribute_not_exists(FriendID)')
+        else:
+            table.put_item(Item=item)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            raise FriendExistsError(f'Friend already exists: {friend_id}')
+        logging.error(f'DynamoDB error when creating record: {e}')
+        return None
     except Exception as e:
         logging.error(f'DynamoDB error when creating record: {e}')
         return None
 
+    friend_cache.delete(friend_id)
+    update_indexes(added=[item])
+    return item
+
 
 # =====================================
 # Retrieve one friend record by FriendID
 # =====================================
 def get_one_friend(friend_id: str) -> Optional[Dict[str, Any]]:
     """
-    Fetches one friend record from DynamoDB by FriendID.
-    Returns the record dict or None if not found.
+    Fetches one friend record by FriendID, from the friend cache when possible
+    and from DynamoDB otherwise. Returns the record dict or None if not found.
     """
+    cached = friend_cache.get(friend_id)
+    if cached is not None:
+        return dict(cached)
     try:
         response = table.get_item(Key={'FriendID': friend_id})
-        return response.get('Item')
+        item = response.get('Item')
+        if item:
+            friend_cache.set(friend_id, item)
+            return dict(item)
+        return item
     except Exception as e:
         logging.error(f'DynamoDB error reading record: {e}')
         return None
 
 
 # ======================================
-# Retrieve all friends from DynamoDB table
+# Remember the Telegram file_id of a friend's photo
 # ======================================
-def get_all_friends() -> Optional[List[Dict[str, Any]]]:
+def set_telegram_file_id(friend_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Stores the Telegram file_id of the friend's photo on the existing record.
+    Returns the updated record, or None if the friend does not exist or on error.
+    """
+    try:
+        response = table.update_item(
+            Key={'FriendID': friend_id},
+            UpdateExpression='SET TelegramFileID = :file_id',
+            ConditionExpression='attribute_exists(FriendID)',
+            ExpressionAttributeValues={':file_id': file_id},
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logging.error(f'DynamoDB error storing Telegram file_id: {e}')
+        return None
+    except Exception as e:
+        logging.error(f'Unknown error storing Telegram file_id: {e}')
+        return None
+
+    friend_cache.delete(friend_id)
+    # The description is unchanged, so the similarity index needs no update
+    update_indexes(added=[response['Attributes']], similarity=False)
+    return response['Attributes']
+
+
+# ======================================
+# Encode / decode opaque pagination cursors
+# ======================================
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
     """
-    Scans the entire DynamoDB table to retrieve all friends.
-    Handles pagination using LastEvaluatedKey.
+    Encodes a DynamoDB LastEvaluatedKey into an opaque URL-safe cursor.
+    Returns None when there is no further page.
     """
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decodes a cursor produced by encode_cursor back into an ExclusiveStartKey.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if not isinstance(key, dict) or not key:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return key
+
+
+# ======================================
+# Retrieve one page of friends from DynamoDB
+# ======================================
+def get_friends_page(
+    limit: int,
+    cursor: Optional[str] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Scans a single page of at most `limit` friends starting after `cursor`.
+    Returns the items and the cursor of the next page (None on the last page),
+    or None on a DynamoDB error. Raises ValueError for a malformed cursor.
+    """
+    scan_kwargs: Dict[str, Any] = {'Limit': limit}
+    if cursor:
+        scan_kwargs['ExclusiveStartKey'] = decode_cursor(cursor)
+
     try:
-        response = table.scan()
+        response = table.scan(**scan_kwargs)
         items = response.get('Items', [])
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        return items, encode_cursor(response.get('LastEvaluatedKey'))
+    except Exception as e:
+        logging.error(f'DynamoDB error during page scan: {e}')
+        return None
+
+
+# ======================================
+# Retrieve one owner's friends page by page
+# ======================================
+def get_owner_friends_page(
+    owner_id: str,
+    limit: int,
+    cursor: Optional[str] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Queries a single page of at most `limit` friends of one owner through the
+    OwnerID index, so only that owner's items are read.
+    Returns the items and the next cursor, or None on a DynamoDB error.
+    Raises ValueError for a malformed cursor.
+    """
+    query_kwargs: Dict[str, Any] = {
+        'IndexName': OWNER_INDEX_NAME,
+        'KeyConditionExpression': Key('OwnerID').eq(owner_id),
+        'Limit': limit
+    }
+    if cursor:
+        query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor)
+
+    try:
+        response = table.query(**query_kwargs)
+        return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+    except Exception as e:
+        logging.error(f'DynamoDB error during owner query: {e}')
+        return None
+
+
+# ======================================
+# Retrieve all friends of one owner
+# ======================================
+def get_all_owner_friends(owner_id: str) -> Optional[List[Dict[str, Any]]]:
+    items: List[Dict[str, Any]] = []
+    query_kwargs: Dict[str, Any] = {
+        'IndexName': OWNER_INDEX_NAME,
+        'KeyConditionExpression': Key('OwnerID').eq(owner_id)
+    }
+    try:
+        while True:
+            response = table.query(**query_kwargs)
             items.extend(response.get('Items', []))
+            if not response.get('LastEvaluatedKey'):
+                return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        logging.error(f'DynamoDB error during owner query: {e}')
+        return None
+
+
+# ======================================
+# Retrieve friends with one exact profession
+# ======================================
+def get_friends_by_profession(
+    profession: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    keep: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Queries a page of friends whose normalized profession equals the given one
+    through the ProfessionNorm index. With `keep`, only the friends it accepts
+    are returned and index pages are read until `limit` of them are found.
+    Returns the items and the next cursor, or None on a DynamoDB error.
+    Raises ValueError for a malformed cursor.
+    """
+    profession_norm = normalize_profession(profession)
+    if not profession_norm:
+        # Blank professions are not indexed
+        return [], None
+    query_kwargs: Dict[str, Any] = {
+        'IndexName': PROFESSION_INDEX_NAME,
+        'KeyConditionExpression': Key('ProfessionNorm').eq(profession_norm),
+        'Limit': limit
+    }
+    start_key = decode_cursor(cursor) if cursor else None
+
+    items: List[Dict[str, Any]] = []
+    try:
+        while True:
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            response = table.query(**query_kwargs)
+            start_key = response.get('LastEvaluatedKey')
+            page = response.get('Items', [])
+            if keep is not None:
+                page = [item for item in page if keep(item)]
+            needed = limit - len(items)
+            if len(page) > needed:
+                # Resume right after the last friend returned
+                page = page[:needed]
+                start_key = {'FriendID': page[-1]['FriendID'], 'ProfessionNorm': profession_norm}
+            items.extend(page)
+            if len(items) == limit or not start_key:
+                return items, encode_cursor(start_key)
+    except Exception as e:
+        logging.error(f'DynamoDB error during profession query: {e}')
+        return None
+
+
+# ======================================
+# Retry delay for DynamoDB batch operations
+# ======================================
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with jitter for retrying unprocessed batch entries.
+    """
+    return min(DYNAMODB_BACKOFF_CAP, DYNAMODB_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+# ======================================
+# Retrieve many friends by FriendID in batches
+# ======================================
+def get_friends_by_ids(friend_ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Fetches friend records by FriendID using the friend cache and DynamoDB
+    batch_get_item (100 keys per call), retrying UnprocessedKeys with backoff.
+    Returns {FriendID: record} for the friends that exist, or None on error.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    for friend_id in dict.fromkeys(friend_ids):
+        cached = friend_cache.get(friend_id)
+        if cached is not None:
+            found[friend_id] = dict(cached)
+        else:
+            missing.append(friend_id)
+
+    try:
+        for start in range(0, len(missing), DYNAMODB_BATCH_GET_SIZE):
+            keys = [{'FriendID': friend_id} for friend_id in missing[start:start + DYNAMODB_BATCH_GET_SIZE]]
+            request: Optional[Dict[str, Any]] = {TABLE_NAME: {'Keys': keys}}
+            attempt = 0
+            while request:
+                response = dynamo_db.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(TABLE_NAME, []):
+                    friend_cache.set(item['FriendID'], item)
+                    found[item['FriendID']] = dict(item)
+
+                request = response.get('UnprocessedKeys') or None
+                if request:
+                    attempt += 1
+                    if attempt > DYNAMODB_BATCH_MAX_RETRIES:
+                        raise RuntimeError(f'UnprocessedKeys left after {DYNAMODB_BATCH_MAX_RETRIES} retries')
+                    time.sleep(backoff_delay(attempt))
+        return found
+    except Exception as e:
+        logging.error(f'DynamoDB error during batch read: {e}')
+        return None
+
+
+# ======================================
+# Write many put/delete requests in batches
+# ======================================
+def batch_write_requests(write_requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sends PutRequest/DeleteRequest entries with batch_write_item, 25 per call,
+    retrying UnprocessedItems with backoff.
+    Returns the requests that could not be written.
+    """
+    failed: List[Dict[str, Any]] = []
+    for start in range(0, len(write_requests), DYNAMODB_BATCH_WRITE_SIZE):
+        pending = write_requests[start:start + DYNAMODB_BATCH_WRITE_SIZE]
+        attempt = 0
+        try:
+            while pending:
+                response = dynamo_db.batch_write_item(RequestItems={TABLE_NAME: pending})
+                pending = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+                if pending:
+                    attempt += 1
+                    if attempt > DYNAMODB_BATCH_MAX_RETRIES:
+                        logging.error(f'{len(pending)} batch writes still unprocessed after {DYNAMODB_BATCH_MAX_RETRIES} retries')
+                        failed.extend(pending)
+                        break
+                    time.sleep(backoff_delay(attempt))
+        except Exception as e:
+            logging.error(f'DynamoDB error during batch write: {e}')
+            failed.extend(pending)
+    return failed
+
+
+# ======================================
+# Create many friend records in batches
+# ======================================
+def batch_create_friends(items: List[Dict[str, Any]]) -> List[str]:
+    """
+    Stores prepared friend records (see build_friend_item) with batch writes.
+    Returns the FriendIDs that could not be stored.
+    """
+    failed = batch_write_requests([{'PutRequest': {'Item': item}} for item in items])
+    failed_ids = [request['PutRequest']['Item']['FriendID'] for request in failed]
+    for item in items:
+        friend_cache.delete(item['FriendID'])
+    update_indexes(added=[item for item in items if item['FriendID'] not in failed_ids])
+    return failed_ids
+
+
+# ======================================
+# Parallel segmented scan of the whole table
+# ======================================
+_SCAN_DONE = object()
+
+
+def scan_all_friends(
+    total_segments: Optional[int] = None,
+    page_size: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+    """
+    Yields every friend in the table using a parallel segmented scan.
+    Each of `total_segments` workers scans its own Segment page by page and
+    items are yielded as pages arrive, in no particular order.
+    Worker errors are re-raised in the consuming thread.
+    """
+    total_segments = max(1, total_segments or SCAN_SEGMENTS)
+    # Bounded so that slow consumers apply backpressure to the workers
+    pages: queue.Queue = queue.Queue(maxsize=total_segments * 2)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment: int) -> None:
+        scan_kwargs: Dict[str, Any] = {'Segment': segment, 'TotalSegments': total_segments}
+        if page_size:
+            scan_kwargs['Limit'] = page_size
+        try:
+            while not stop.is_set():
+                response = table.scan(**scan_kwargs)
+                if not put(response.get('Items', [])):
+                    return
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except Exception as e:
+            put(e)
+        finally:
+            put(_SCAN_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=total_segments, thread_name_prefix='dynamodb-scan')
+    try:
+        for segment in range(total_segments):
+            executor.submit(scan_segment, segment)
+
+        finished = 0
+        while finished < total_segments:
+            entry = pages.get()
+            if entry is _SCAN_DONE:
+                finished += 1
+            elif isinstance(entry, Exception):
+                raise entry
+            else:
+                yield from entry
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+# ======================================
+# Retrieve all friends from DynamoDB table
+# ======================================
+def get_all_friends() -> Optional[List[Dict[str, Any]]]:
+    """
+    Reads the entire DynamoDB table to retrieve all friends.
+    Uses the parallel segmented scan, so pages are fetched concurrently.
+    """
+    try:
+        items = list(scan_all_friends())
         logging.info(f"Successfully retrieved {len(items)} friends.")
         return items
     except Exception as e:
@@ -145,6 +764,77 @@ def get_all_friends() -> Optional[List[Dict[str, Any]]]:
         return None
 
 
+# ======================================
+# (Re)build the in-process search index
+# ======================================
+def rebuild_search_index() -> bool:
+    """
+    Loads every friend into the search index with the parallel scan.
+    Returns True on success, False otherwise.
+    """
+    try:
+        search_index.build(scan_all_friends())
+        logging.info(f'Search index built with {len(search_index)} friends')
+        return True
+    except Exception as e:
+        logging.error(f'Error building search index: {e}')
+        return False
+
+
+# ======================================
+# Keep the search indexes in step with writes
+# ======================================
+def update_indexes(
+    added: Sequence[Dict[str, Any]] = (),
+    removed: Sequence[str] = (),
+    similarity: bool = True
+    ) -> None:
+    """
+    Applies stored/deleted friends to the in-process search index and queues
+    them for the similarity index. Called after the table write succeeded,
+    so errors are logged and never reported as a failed write.
+    """
+    try:
+        for item in added:
+            search_index.add(item)
+        for friend_id in removed:
+            search_index.remove(friend_id)
+    except Exception as e:
+        logging.error(f'Error updating search index: {e}')
+    if similarity and (added or removed):
+        similarity_executor.submit(apply_similarity_changes, list(added), list(removed))
+
+
+def apply_similarity_changes(added: List[Dict[str, Any]], removed: List[str]) -> None:
+    try:
+        for item in added:
+            similarity_index.add(item)
+        for friend_id in removed:
+            similarity_index.remove(friend_id)
+    except Exception as e:
+        logging.error(f'Error updating similarity index: {e}')
+
+
+# ======================================
+# Open the similar-friends index
+# ======================================
+def open_similarity_index(rebuild: bool = False) -> bool:
+    """
+    Loads the similarity index from disk, or builds it with the parallel scan
+    if there is none (or `rebuild` is set). Returns True on success.
+    """
+    try:
+        if not rebuild and similarity_index.load():
+            logging.info(f'Similarity index loaded with {len(similarity_index)} friends')
+            return True
+        similarity_index.build(scan_all_friends())
+        logging.info(f'Similarity index built with {len(similarity_index)} friends')
+        return True
+    except Exception as e:
+        logging.error(f'Error opening similarity index: {e}')
+        return False
+
+
 # ======================================
 # Delete a friend record from DynamoDB
 # ======================================
@@ -155,6 +845,8 @@ def delete_friend(friend_id: str):
     """
     try:
         response = table.delete_item(Key={'FriendID': friend_id})
+        friend_cache.delete(friend_id)
+        update_indexes(removed=[friend_id])
         if response['ResponseMetadata']['HTTPStatusCode'] == 200:
             return True
         else:
@@ -168,6 +860,22 @@ def delete_friend(friend_id: str):
         return False
 
 
+# ======================================
+# Delete many friend records in batches
+# ======================================
+def batch_delete_friends(friend_ids: List[str]) -> List[str]:
+    """
+    Deletes friend records by FriendID with batch writes.
+    Returns the FriendIDs that could not be deleted.
+    """
+    failed = batch_write_requests([{'DeleteRequest': {'Key': {'FriendID': friend_id}}} for friend_id in friend_ids])
+    failed_ids = [request['DeleteRequest']['Key']['FriendID'] for request in failed]
+    for friend_id in friend_ids:
+        friend_cache.delete(friend_id)
+    update_indexes(removed=[friend_id for friend_id in friend_ids if friend_id not in failed_ids])
+    return failed_ids
+
+
 # ======================================
 # Delete photo file from AWS S3 bucket
 # ======================================
@@ -177,7 +885,7 @@ def delete_file_from_s3(s3_key: str) -> bool:
     Returns True if deletion was successful, otherwise False.
     """
     try:
-        s3_client = boto3.client('s3', region_name=AWS_REGION)
+        s3_client = get_s3_client()
         
         response = s3_client.delete_object(
             Bucket=S3_BUCKET_NAME,
@@ -196,3 +904,32 @@ def delete_file_from_s3(s3_key: str) -> bool:
     except Exception as e:
         logging.error(f"Unknown error during S3 delete: {e}")
         return False
+
+
+# ======================================
+# Delete many files from AWS S3 bucket
+# ======================================
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def delete_files_from_s3(s3_keys: List[str]) -> List[str]:
+    """
+    Deletes files from the S3 bucket with delete_objects, up to 1000 keys per call.
+    Missing keys count as deleted. Returns the keys that could not be deleted.
+    """
+    failed: List[str] = []
+    s3_client = get_s3_client()
+    for start in range(0, len(s3_keys), S3_DELETE_BATCH_SIZE):
+        batch = s3_keys[start:start + S3_DELETE_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=S3_BUCKET_NAME,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            for error in response.get('Errors', []):
+                logging.error(f"S3 delete failed for {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+                failed.append(error.get('Key'))
+        except Exception as e:
+            logging.error(f'Error during S3 batch delete of {len(batch)} keys: {e}')
+            failed.extend(batch)
+    return failed
@@ -0,0 +1,85 @@
+import os
+import posixpath
+from io import BytesIO
+from typing import Optional, List
+from PIL import Image, ImageOps
+'''
+Photo derivatives (resized renditions) stored next to the original photo in S3.
+Renditions are recompressed and written without EXIF/ICC metadata.
+'''
+
+# Longest side in pixels for each rendition
+DERIVATIVE_SIZES = {
+    'thumb': 160,
+    'medium': 640
+}
+
+# Output formats: content type and file extension
+DERIVATIVE_FORMATS = {
+    'webp': ('image/webp', 'webp'),
+    'jpeg': ('image/jpeg', 'jpg')
+}
+
+DERIVATIVE_QUALITY = int(os.getenv('DERIVATIVE_QUALITY', 80))
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Picks WebP when the client's Accept header allows it, JPEG otherwise.
+    """
+    if accept and 'image/webp' in accept.lower():
+        return 'webp'
+    return 'jpeg'
+
+
+def derivative_key(s3_key: str, size: str, image_format: str) -> str:
+    """
+    S3 key of a rendition, e.g. media/{friend_id}/thumb/alice.webp
+    for the original media/{friend_id}/alice.jpg.
+    """
+    folder, filename = posixpath.split(s3_key)
+    stem = posixpath.splitext(filename)[0] or 'photo'
+    return f'{folder}/{size}/{stem}.{DERIVATIVE_FORMATS[image_format][1]}'
+
+
+def is_derivative_key(s3_key: str) -> bool:
+    """
+    True for the key of a rendition (its folder is named after a size).
+    """
+    return posixpath.basename(posixpath.dirname(s3_key)) in DERIVATIVE_SIZES
+
+
+def all_derivative_keys(s3_key: str) -> List[str]:
+    return [derivative_key(s3_key, size, image_format) for size in DERIVATIVE_SIZES for image_format in DERIVATIVE_FORMATS]
+
+
+def render_derivative(content: bytes, size: str, image_format: str) -> bytes:
+    """
+    Resizes the original photo to the rendition's bounding box (never upscaling),
+    applies the EXIF orientation and recompresses it without metadata.
+    Raises PIL.UnidentifiedImageError if the content is not an image.
+    """
+    max_side = DERIVATIVE_SIZES[size]
+    with Image.open(BytesIO(content)) as image:
+        # Let the JPEG decoder downscale while decoding
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        if image_format == 'jpeg' or not has_alpha:
+            if has_alpha:
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+        elif image.mode != 'RGBA':
+            image = image.convert('RGBA')
+
+        output = BytesIO()
+        if image_format == 'jpeg':
+            image.save(output, format='JPEG', quality=DERIVATIVE_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(output, format='WEBP', quality=DERIVATIVE_QUALITY, method=4)
+        return output.getvalue()
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+'''
+Process-wide gateway to the OpenAI API. One pooled AsyncOpenAI client serves
+every request, at most LLM_MAX_CONCURRENCY completions run upstream at once
+(callers wait up to LLM_QUEUE_TIMEOUT seconds for a slot), and identical
+prompts that are already in flight share a single upstream call.
+'''
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_APY_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 10))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 60))
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within the queue wait timeout."""
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: Optional[str] = OPENAI_API_KEY,
+        base_url: Optional[str] = OPENAI_BASE_URL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        request_timeout: float = LLM_REQUEST_TIMEOUT
+        ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.request_timeout
+            )
+        return self._client
+
+    @staticmethod
+    def prompt_key(model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        payload = json.dumps([model, messages, temperature], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def acquire_slot(self) -> None:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError(f'No LLM slot free within {self.queue_timeout}s')
+
+    async def _create_completion(self, model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        await self.acquire_slot()
+        try:
+            self.upstream_calls += 1
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature
+            )
+            return response.choices[0].message.content.strip()
+        finally:
+            self._slots.release()
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        """
+        Returns the completion text for the prompt. Concurrent callers with an
+        identical prompt await the same upstream call; a caller that goes away
+        does not cancel it for the others.
+        """
+        key = self.prompt_key(model, messages, temperature)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._create_completion(model, messages, temperature))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced_calls += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], temperature: float) -> AsyncIterator[str]:
+        """
+        Yields the completion text piece by piece as the model generates it.
+        Holds one concurrency slot for the whole stream; streams are not coalesced.
+        """
+        await self.acquire_slot()
+        try:
+            self.upstream_calls += 1
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            self._slots.release()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the result as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'upstream_calls': self.upstream_calls,
+            'coalesced_calls': self.coalesced_calls,
+            'in_flight': len(self._in_flight),
+            'max_concurrency': self.max_concurrency
+        }
+
+
+# One gateway per event loop: its client pool and semaphore are bound to the
+# loop, and uvicorn runs a single loop per worker process
+_gateways: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMGateway]' = weakref.WeakKeyDictionary()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    Returns the gateway of the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    gateway = _gateways.get(loop)
+    if gateway is None:
+        gateway = _gateways[loop] = LLMGateway()
+    return gateway
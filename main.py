@@ -1,19 +1,115 @@
-from typing import List
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, status, Response
-from models import FriendCreate, FriendResponse, Questions
-from database import create_new_friend, upload_file_to_s3, get_file_from_s3, get_one_friend, get_all_friends, delete_friend, delete_file_from_s3
-from fastapi.responses import StreamingResponse
-from io import BytesIO
+from typing import Dict, List, Optional, Literal, Iterator, AsyncIterator
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Header, status, Response
+from models import FriendCreate, FriendResponse, FriendPage, SimilarFriend, FriendIDs, BatchDeleteResult, TelegramFile, FriendImport, FriendImportResult, Questions, BatchQuestions, BatchAnswer, PhotoUploadRequest, PhotoUploadTicket, PhotoUploadComplete
+from database import FileTooLargeError, FriendExistsError, friend_cache, scan_all_friends, new_friend_id, make_s3_key, build_friend_item
+from async_database import create_new_friend, set_telegram_file_id, batch_create_friends, batch_delete_friends, upload_fileobj_to_s3, upload_file_to_s3, get_file_from_s3, delete_files_from_s3, get_file_stream_from_s3, get_file_metadata_from_s3, create_presigned_upload, create_presigned_download_url, get_one_friend, get_friends_by_ids, get_all_friends, get_friends_page, get_owner_friends_page, get_all_owner_friends, get_friends_by_profession, rebuild_search_index, open_similarity_index, delete_friend, delete_file_from_s3
+from fastapi.responses import StreamingResponse, RedirectResponse, JSONResponse
+from io import StringIO
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timezone
+import asyncio
+import csv
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import zipfile
 from answer_model import AIManager
+from answer_cache import answer_cache
+from llm_gateway import LLMBusyError
+from search_index import search_index, matches_query
+from similarity_index import similarity_index
+from images import DERIVATIVE_FORMATS, negotiate_format, derivative_key, is_derivative_key, all_derivative_keys, render_derivative
+from PIL import UnidentifiedImageError
+from PIL.Image import DecompressionBombError
+from starlette.concurrency import run_in_threadpool
+from pydantic import ValidationError
 import logging
 
 # === Constants for file size and allowed types ===
 MAX_FILE_SIZE = 8 * 1024 * 1024  # 8MB limit
 ALLOWED_MIME_TYPES = ["image/jpeg", "image/png"]
 
+# === Constants for presigned (direct-to-S3) photo transfer ===
+MEDIA_REDIRECT = os.getenv('MEDIA_REDIRECT', 'false').lower() == 'true'
+PRESIGNED_URL_EXPIRES = int(os.getenv('PRESIGNED_URL_EXPIRES', 300))
+
+# === Constants for media streaming ===
+MEDIA_CHUNK_SIZE = 64 * 1024
+BYTE_RANGE_PATTERN = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+# === Max records and max request body (all photos together) of one bulk import ===
+MAX_IMPORT_RECORDS = int(os.getenv('MAX_IMPORT_RECORDS', 100))
+MAX_IMPORT_BODY = int(os.getenv('MAX_IMPORT_BODY', 50 * 1024 * 1024))
+
+# === Max request body of the upload routes (photos plus room for the other form fields) ===
+FORM_OVERHEAD = 64 * 1024
+UPLOAD_BODY_LIMITS = {
+	'/friends': MAX_FILE_SIZE + FORM_OVERHEAD,
+	'/friends/batch': MAX_IMPORT_BODY + FORM_OVERHEAD
+}
+
+# === Max AI answers generated at once for one batch request ===
+BATCH_AI_CONCURRENCY = int(os.getenv('BATCH_AI_CONCURRENCY', 4))
+
+# === Constants for friends list pagination ===
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# === Seconds before the in-process search index is rebuilt from the table ===
+SEARCH_INDEX_REFRESH = float(os.getenv('SEARCH_INDEX_REFRESH', 300))
+
+# === Similar friends: max neighbours per request, seconds before the saved index is rebuilt ===
+MAX_SIMILAR_FRIENDS = 50
+SIMILARITY_INDEX_REFRESH = float(os.getenv('SIMILARITY_INDEX_REFRESH', 3600))
+
+# === Column order for friends export ===
+EXPORT_FIELDS = ['FriendID', 'Name', 'Profession', 'ProfessionDescription', 'S3Key', 'PhotoUrl', 'OwnerID', 'TelegramFileID']
+
 # === Initialize FastAPI app ===
 app = FastAPI(title = 'Friends DynamoDB & S3 API')
 
+# === Middleware: cap upload bodies before they are parsed ===
+class UploadLimitMiddleware:
+	"""
+	Starlette receives and spools the whole multipart body before a handler
+	runs, so oversized uploads are stopped here: by Content-Length up front,
+	and by counting received bytes for bodies sent without it.
+	"""
+
+	def __init__(self, app):
+		self.app = app
+
+	async def __call__(self, scope, receive, send):
+		limit = UPLOAD_BODY_LIMITS.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+		if limit is None:
+			await self.app(scope, receive, send)
+			return
+
+		content_length = dict(scope['headers']).get(b'content-length', b'')
+		if content_length.isdigit() and int(content_length) > limit:
+			response = JSONResponse({'detail': 'Request body too large'}, status_code = 413)
+			await response(scope, receive, send)
+			return
+
+		received = 0
+
+		async def limited_receive():
+			nonlocal received
+			message = await receive()
+			if message['type'] == 'http.request':
+				received += len(message.get('body', b''))
+				if received > limit:
+					raise HTTPException(status_code = 413, detail = 'Request body too large')
+			return message
+
+		await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadLimitMiddleware)
+
 # === Logging configuration ===
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -24,7 +120,8 @@ async def create_friend(
 	name: str = Form(...),
 	profession: str = Form(...),
 	profession_description: str = Form(...),
-	photo: UploadFile = File(...)
+	photo: UploadFile = File(...),
+	owner_id: Optional[str] = Header(None, alias = 'X-Owner-ID')
 	):
 	try:
 		# Validate and create friend object via Pydantic model
@@ -32,47 +129,393 @@ async def create_friend(
 		friend_data_dict = metadata.model_dump(by_alias = True)
 		filename = photo.filename if  photo.filename else ''
 
-		# Create record in DynamoDB (without photo)
-		result = create_new_friend(data = friend_data_dict, filename = filename)
-		if not result:
-			raise HTTPException(status_code = 500, detail = 'DynamoDB error when creating record')
-
-		# Read photo bytes
-		file_content = await photo.read()
-
-		# Check file size limit
-		if len(file_content) > MAX_FILE_SIZE:
+		# Reject oversized uploads up front when the size is already known
+		if photo.size is not None and photo.size > MAX_FILE_SIZE:
 			raise HTTPException(status_code = 400, detail = "File size limit (8MB) exceeded")
 
-		# Upload photo to AWS S3
-		s3_key = result['S3Key']
-		upload_result_url = upload_file_to_s3(
-			file_content = file_content,
-			s3_key = s3_key,
-			content_type = photo.content_type
-			)
+		# Stream photo to AWS S3 chunk by chunk (multipart above one part)
+		friend_id = new_friend_id()
+		s3_key = make_s3_key(friend_id, filename)
+		try:
+			upload_result_url = await upload_fileobj_to_s3(
+				fileobj = photo.file,
+				s3_key = s3_key,
+				content_type = photo.content_type,
+				max_size = MAX_FILE_SIZE
+				)
+		except FileTooLargeError:
+			raise HTTPException(status_code = 400, detail = "File size limit (8MB) exceeded")
 
 		# Check if S3 upload succeeded
 		if not upload_result_url:
-			raise HTTPException(status_code = 500, detail = 'S3 upload failed')		
+			raise HTTPException(status_code = 500, detail = 'S3 upload failed')
+
+		# Create record in DynamoDB only once the photo is stored
+		result = await create_new_friend(data = friend_data_dict, filename = filename, friend_id = friend_id, owner_id = owner_id)
+		if not result:
+			await delete_file_from_s3(s3_key)
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error when creating record')
 
 		# Return the created record
 		return result
 
+	except HTTPException:
+		raise
 	except Exception as e:
 		# General error handling
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
 
 
 
-# === ENDPOINT: Get all friends ===
-@app.get('/friends', response_model = List[FriendResponse])
-def get_friends():
+# === ENDPOINT: Start a direct-to-S3 photo upload (presigned POST) ===
+@app.post('/friends/uploads', response_model = PhotoUploadTicket)
+async def start_photo_upload(upload: PhotoUploadRequest):
+	try:
+		if upload.content_type not in ALLOWED_MIME_TYPES:
+			raise HTTPException(status_code = 400, detail = f'Unsupported photo type: {upload.content_type}')
+
+		# Reserve the friend ID and S3 key; the record is created on completion
+		friend_id = new_friend_id()
+		s3_key = make_s3_key(friend_id, posixpath.basename(upload.filename) or 'photo')
+		presigned = await create_presigned_upload(
+			s3_key = s3_key,
+			content_type = upload.content_type,
+			max_size = MAX_FILE_SIZE,
+			expires_in = PRESIGNED_URL_EXPIRES
+			)
+		if not presigned:
+			raise HTTPException(status_code = 500, detail = 'S3 presign failed')
+
+		return {
+			'friend_id': friend_id,
+			's3_key': s3_key,
+			'upload_url': presigned['url'],
+			'upload_fields': presigned['fields'],
+			'expires_in': PRESIGNED_URL_EXPIRES
+			}
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Confirm a direct-to-S3 upload and create the friend ===
+@app.post('/friends/uploads/{friend_id}/complete', response_model = FriendResponse)
+async def complete_photo_upload(
+	friend_id: str,
+	upload: PhotoUploadComplete,
+	owner_id: Optional[str] = Header(None, alias = 'X-Owner-ID')
+	):
 	try:
-		result = get_all_friends()
+		prefix = make_s3_key(friend_id, '')
+		filename = upload.s3_key[len(prefix):] if upload.s3_key.startswith(prefix) else ''
+		if not filename or '/' in filename:
+			raise HTTPException(status_code = 400, detail = f'S3 key does not belong to friend: {friend_id}')
+		if await get_one_friend(friend_id):
+			raise HTTPException(status_code = 409, detail = f'Friend already exists: {friend_id}')
+
+		# Confirm the object actually landed in S3 and matches the limits
+		metadata = await get_file_metadata_from_s3(upload.s3_key)
+		if not metadata:
+			raise HTTPException(status_code = 400, detail = f'Photo has not been uploaded: {upload.s3_key}')
+		if metadata['ContentLength'] > MAX_FILE_SIZE or metadata.get('ContentType') not in ALLOWED_MIME_TYPES:
+			await delete_file_from_s3(upload.s3_key)
+			raise HTTPException(status_code = 400, detail = 'Uploaded photo violates size or type limits')
+
+		friend_data_dict = upload.model_dump(by_alias = True, include = {'name', 'profession', 'profession_description'})
+		try:
+			# Conditional write: of two concurrent completions only one creates the record
+			result = await create_new_friend(
+				data = friend_data_dict,
+				filename = filename,
+				friend_id = friend_id,
+				owner_id = owner_id,
+				only_if_new = True
+				)
+		except FriendExistsError:
+			raise HTTPException(status_code = 409, detail = f'Friend already exists: {friend_id}')
 		if not result:
-			raise HTTPException(status_code = 404,detail = 'No friends added found' )
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error when creating record')
 		return result
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Create many friends with their photos in one request ===
+@app.post('/friends/batch', response_model = List[FriendImportResult])
+async def create_friends_batch(
+	records: str = Form(...),
+	photos: List[UploadFile] = File([]),
+	archive: Optional[UploadFile] = File(None),
+	owner_id: Optional[str] = Header(None, alias = 'X-Owner-ID')
+	):
+	zip_file = None
+	try:
+		try:
+			raw_records = json.loads(records)
+		except ValueError:
+			raise HTTPException(status_code = 400, detail = 'records must be a JSON array')
+		if not isinstance(raw_records, list) or not raw_records:
+			raise HTTPException(status_code = 400, detail = 'records must be a non-empty JSON array')
+		if len(raw_records) > MAX_IMPORT_RECORDS:
+			raise HTTPException(status_code = 400, detail = f'At most {MAX_IMPORT_RECORDS} records per batch')
+
+		# Photos are matched to records by filename, either multipart parts or ZIP archive entries
+		if archive is not None:
+			try:
+				zip_file = await run_in_threadpool(zipfile.ZipFile, archive.file)
+			except zipfile.BadZipFile:
+				raise HTTPException(status_code = 400, detail = 'archive must be a ZIP file')
+			sources = {posixpath.basename(entry.filename): entry for entry in zip_file.infolist() if not entry.is_dir()}
+		else:
+			sources = {photo.filename: photo for photo in photos if photo.filename}
+
+		# Validate every record up front; invalid ones fail without touching S3
+		results: List[Optional[FriendImportResult]] = [None] * len(raw_records)
+		pending = []
+		used_photos = set()
+		for index, raw in enumerate(raw_records):
+			try:
+				record = FriendImport.model_validate(raw)
+			except ValidationError as e:
+				results[index] = FriendImportResult(index = index, status = 'failed', error = f'Invalid record: {e.errors()[0]["msg"]}')
+				continue
+			filename = posixpath.basename(record.photo)
+			source = sources.get(filename)
+			if source is None:
+				error = f'Photo not found: {filename}'
+			elif filename in used_photos:
+				error = f'Photo already used by another record: {filename}'
+			else:
+				if isinstance(source, zipfile.ZipInfo):
+					size, content_type = source.file_size, mimetypes.guess_type(filename)[0]
+				else:
+					size, content_type = source.size, source.content_type
+				if size is not None and size > MAX_FILE_SIZE:
+					error = "File size limit (8MB) exceeded"
+				elif content_type not in ALLOWED_MIME_TYPES:
+					error = f'Unsupported photo type: {content_type}'
+				else:
+					error = None
+			if error:
+				results[index] = FriendImportResult(index = index, status = 'failed', error = error)
+				continue
+			used_photos.add(filename)
+			data = record.model_dump(by_alias = True, include = {'name', 'profession', 'profession_description'})
+			pending.append((index, build_friend_item(data, filename, new_friend_id(), owner_id), source, content_type))
+
+		# Upload all photos concurrently; the storage limiter keeps them within the S3 connection pool
+		async def upload_photo(item, source, content_type) -> Optional[str]:
+			fileobj = await run_in_threadpool(zip_file.open, source) if zip_file else source.file
+			try:
+				if await upload_fileobj_to_s3(fileobj = fileobj, s3_key = item['S3Key'], content_type = content_type, max_size = MAX_FILE_SIZE):
+					return None
+				return 'S3 upload failed'
+			except FileTooLargeError:
+				return "File size limit (8MB) exceeded"
+			finally:
+				if zip_file:
+					fileobj.close()
+
+		upload_errors = await asyncio.gather(*[upload_photo(item, source, content_type) for _, item, source, content_type in pending])
+		uploaded = []
+		for (index, item, _, _), error in zip(pending, upload_errors):
+			if error:
+				results[index] = FriendImportResult(index = index, status = 'failed', error = error)
+			else:
+				uploaded.append((index, item))
+
+		# Store the records in 25-item batch writes; drop the photos of records that could not be stored
+		failed_ids = set(await batch_create_friends([item for _, item in uploaded]))
+		if failed_ids:
+			await delete_files_from_s3([item['S3Key'] for _, item in uploaded if item['FriendID'] in failed_ids])
+		for index, item in uploaded:
+			if item['FriendID'] in failed_ids:
+				results[index] = FriendImportResult(index = index, status = 'failed', error = 'DynamoDB error when creating record')
+			else:
+				results[index] = FriendImportResult(index = index, status = 'created', friend = item)
+
+		return results
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+	finally:
+		if zip_file:
+			zip_file.close()
+
+
+
+# === ENDPOINT: Get friends page by page (full list only on explicit opt-in) ===
+@app.get('/friends', response_model = FriendPage)
+async def get_friends(
+	limit: int = Query(DEFAULT_PAGE_SIZE, ge = 1, le = MAX_PAGE_SIZE),
+	cursor: Optional[str] = None,
+	fetch_all: bool = Query(False, alias = 'all', description = 'Return every friend in one response (full table scan)'),
+	ids: Optional[List[str]] = Query(None, description = 'Return only these friends (comma-separated or repeated)'),
+	owner: Optional[str] = Query(None, description = 'Return only the friends of this owner (index query, no scan)')
+	):
+	try:
+		if ids:
+			friend_ids = list(dict.fromkeys(friend_id for value in ids for friend_id in value.split(',') if friend_id))
+			if len(friend_ids) > MAX_PAGE_SIZE:
+				raise HTTPException(status_code = 400, detail = f'At most {MAX_PAGE_SIZE} ids per request')
+			found = await get_friends_by_ids(friend_ids)
+			if found is None:
+				raise HTTPException(status_code = 500, detail = 'DynamoDB error during batch read')
+			# Keep the requested order; unknown IDs are left out
+			return {'items': [found[friend_id] for friend_id in friend_ids if friend_id in found], 'next_cursor': None}
+
+		if owner:
+			if fetch_all:
+				items = await get_all_owner_friends(owner)
+				if items is None:
+					raise HTTPException(status_code = 500, detail = 'DynamoDB error during owner query')
+				return {'items': items, 'next_cursor': None}
+			page = await get_owner_friends_page(owner_id = owner, limit = limit, cursor = cursor)
+			if page is None:
+				raise HTTPException(status_code = 500, detail = 'DynamoDB error during owner query')
+			items, next_cursor = page
+			return {'items': items, 'next_cursor': next_cursor}
+
+		if fetch_all:
+			items = await get_all_friends()
+			if items is None:
+				raise HTTPException(status_code = 500, detail = 'DynamoDB error during full table scan')
+			return {'items': items, 'next_cursor': None}
+
+		page = await get_friends_page(limit = limit, cursor = cursor)
+		if page is None:
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error during page scan')
+		items, next_cursor = page
+		return {'items': items, 'next_cursor': next_cursor}
+	except HTTPException:
+		raise
+	except ValueError as e:
+		raise HTTPException(status_code = 400, detail = str(e))
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === Helpers: serialize scanned friends one record at a time ===
+def iter_export_ndjson(items: Iterator[dict]) -> Iterator[str]:
+	for item in items:
+		friend = FriendResponse.model_validate(item).model_dump(by_alias = True)
+		yield json.dumps(friend, ensure_ascii = False) + '\n'
+
+
+def iter_export_csv(items: Iterator[dict]) -> Iterator[str]:
+	buffer = StringIO()
+	writer = csv.DictWriter(buffer, fieldnames = EXPORT_FIELDS, extrasaction = 'ignore')
+	writer.writeheader()
+	for item in items:
+		writer.writerow(FriendResponse.model_validate(item).model_dump(by_alias = True))
+		yield buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate(0)
+	if buffer.tell():
+		yield buffer.getvalue()
+
+
+def iter_export(export_format: str) -> Iterator[str]:
+	items = scan_all_friends()
+	try:
+		if export_format == 'csv':
+			yield from iter_export_csv(items)
+		else:
+			yield from iter_export_ndjson(items)
+	except Exception as e:
+		# Headers are already sent: re-raise so the server aborts the chunked
+		# body instead of ending it cleanly, and clients see a failed download
+		logging.error(f'Friends export aborted: {e}')
+		raise
+	finally:
+		items.close()
+
+
+
+# === ENDPOINT: Stream all friends as NDJSON or CSV ===
+@app.get('/friends/export')
+async def export_friends(export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias = 'format')):
+	media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+	return StreamingResponse(
+		iter_export(export_format),
+		media_type = media_type,
+		headers = {'Content-Disposition': f'attachment; filename="friends.{export_format}"'}
+		)
+
+
+
+# === Helper: one index build at a time, shared by every request waiting for it ===
+index_tasks: Dict[str, asyncio.Task] = {}
+
+
+def shared_index_task(name: str, start) -> asyncio.Task:
+	"""
+	Returns the running build task stored under `name`, or starts one with
+	start(), so concurrent requests scan the table once.
+	"""
+	task = index_tasks.get(name)
+	if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+		task = index_tasks[name] = asyncio.ensure_future(start())
+	return task
+
+
+
+# === Helper: build the search index on first use, refresh it in the background ===
+async def ensure_search_index() -> None:
+	"""
+	Each worker keeps its own index: creates and deletes made here update it
+	directly, and a periodic rebuild picks up changes made by other workers.
+	"""
+	if search_index.built_at is None:
+		# Shielded: a cancelled request does not cancel the build others wait for
+		if not await asyncio.shield(shared_index_task('search', rebuild_search_index)):
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error while building search index')
+	elif time.monotonic() - search_index.built_at > SEARCH_INDEX_REFRESH:
+		shared_index_task('search', rebuild_search_index)
+
+
+
+# === ENDPOINT: Search friends by name/profession words or by exact profession ===
+@app.get('/friends/search', response_model = FriendPage)
+async def search_friends(
+	q: Optional[str] = Query(None, min_length = 1, description = 'Words or word prefixes matched against Name and Profession'),
+	profession: Optional[str] = Query(None, min_length = 1, description = 'Exact profession, case-insensitive (index query)'),
+	limit: int = Query(DEFAULT_PAGE_SIZE, ge = 1, le = MAX_PAGE_SIZE),
+	cursor: Optional[str] = None
+	):
+	try:
+		if not q and not profession:
+			raise HTTPException(status_code = 400, detail = 'Pass q and/or profession')
+
+		# Exact profession: a page from the ProfessionNorm index, of friends also matching q if given
+		if profession:
+			page = await get_friends_by_profession(
+				profession = profession,
+				limit = limit,
+				cursor = cursor,
+				keep = (lambda item: matches_query(item, q)) if q else None
+			)
+			if page is None:
+				raise HTTPException(status_code = 500, detail = 'DynamoDB error during profession query')
+			items, next_cursor = page
+			return {'items': items, 'next_cursor': next_cursor}
+
+		# Words only: the best `limit` matches, in one page
+		if cursor:
+			raise HTTPException(status_code = 400, detail = 'cursor applies to profession searches only; raise limit instead')
+		await ensure_search_index()
+		return {'items': search_index.search(q, limit), 'next_cursor': None}
+	except HTTPException:
+		raise
+	except ValueError as e:
+		raise HTTPException(status_code = 400, detail = str(e))
 	except Exception as e:
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
 
@@ -80,35 +523,221 @@ def get_friends():
 
 # === ENDPOINT: Get one friend by ID ===
 @app.get('/friends/{friend_id}', response_model = FriendResponse)  
-def get_friend(friend_id: str):
+async def get_friend(friend_id: str):
 	try:
-		result = get_one_friend(friend_id)
+		result = await get_one_friend(friend_id)
 		if not result:
 			raise HTTPException(status_code = 404,detail = f'No found friend: {friend_id}')
 		return result
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
 
 
 
-# === ENDPOINT: Get friend photo from AWS S3 ===
+# === Helpers: media type detection and S3 body streaming ===
+def guess_media_type(s3_key: str, stored_type: Optional[str] = None) -> str:
+	if stored_type and stored_type != 'application/octet-stream':
+		return stored_type
+	if s3_key.lower().endswith(('.jpg', '.jpeg')):
+		return 'image/jpeg'
+	if s3_key.lower().endswith('.png'):
+		return 'image/png'
+	return 'application/octet-stream'
+
+
+def iter_s3_body(body) -> Iterator[bytes]:
+	try:
+		yield from body.iter_chunks(MEDIA_CHUNK_SIZE)
+	finally:
+		body.close()
+
+
+async def ensure_derivative(s3_key: str, size: str, image_format: str) -> str:
+	"""
+	Returns the S3 key of the rendition, generating and storing it from the
+	original photo on first request.
+	"""
+	# Renditions of renditions would be stored where photo deletion never looks
+	if is_derivative_key(s3_key):
+		raise HTTPException(status_code = 400, detail = f'Not an original photo: {s3_key}')
+	key = derivative_key(s3_key, size, image_format)
+	if await get_file_metadata_from_s3(key):
+		return key
+
+	original = await get_file_from_s3(s3_key)
+	if not original:
+		raise HTTPException(status_code = 404, detail = f'No found file at S3 key: {s3_key}')
+	try:
+		rendition = await run_in_threadpool(render_derivative, original, size, image_format)
+	except (UnidentifiedImageError, DecompressionBombError, OSError) as e:
+		raise HTTPException(status_code = 422, detail = f'Photo at {s3_key} cannot be resized: {e}')
+
+	if not await upload_file_to_s3(rendition, key, DERIVATIVE_FORMATS[image_format][0]):
+		raise HTTPException(status_code = 500, detail = 'S3 upload failed')
+	return key
+
+
+
+# === ENDPOINT: Stream friend photo from AWS S3 (Range and conditional requests) or redirect to it ===
 @app.get('/media/{s3_key:path}')
-def get_photo_file(s3_key: str):
+async def get_photo_file(
+	s3_key: str,
+	range_header: Optional[str] = Header(None, alias = 'Range'),
+	if_none_match: Optional[str] = Header(None),
+	if_modified_since: Optional[str] = Header(None),
+	redirect: bool = Query(MEDIA_REDIRECT, description = 'Answer with a 307 to a presigned S3 URL'),
+	size: Optional[Literal['thumb', 'medium']] = Query(None, description = 'Serve a resized rendition instead of the original'),
+	accept: Optional[str] = Header(None)
+	):
 	try:
-		# Retrieve file content from S3
-		file_content = get_file_from_s3(s3_key)
-		if not file_content:
+		# Swap in the resized rendition (WebP when the client accepts it)
+		vary = {}
+		if size:
+			s3_key = await ensure_derivative(s3_key, size, negotiate_format(accept))
+			vary = {'Vary': 'Accept'}
+
+		# Let the client fetch the bytes from S3 directly
+		if redirect:
+			url = await create_presigned_download_url(s3_key, PRESIGNED_URL_EXPIRES)
+			if not url:
+				raise HTTPException(status_code = 500, detail = 'S3 presign failed')
+			return RedirectResponse(url, status_code = 307, headers = vary)
+
+		# Only single byte ranges are forwarded; anything else gets the full file
+		byte_range = range_header if range_header and BYTE_RANGE_PATTERN.match(range_header) else None
+		modified_since = None
+		if if_modified_since:
+			try:
+				modified_since = parsedate_to_datetime(if_modified_since)
+			except (TypeError, ValueError):
+				modified_since = None
+
+		# Open the object in S3 without reading it
+		result = await get_file_stream_from_s3(s3_key, byte_range, if_none_match, modified_since)
+		if not result:
 			raise HTTPException(status_code = 404, detail = f'No found file at S3 key: {s3_key}')
 
-		# Determine content type for response
-		content_type = "application/octet-stream"
-		if s3_key.lower().endswith(('.jpg', '.jpeg')):
-			content_type = "image/jpeg"
-		if s3_key.lower().endswith('.png'):
-			content_type = 'image/png'
+		if result['StatusCode'] == 304:
+			return Response(status_code = 304, headers = {'ETag': result.get('ETag') or if_none_match or '', **vary})
+		if result['StatusCode'] == 416:
+			raise HTTPException(status_code = 416, detail = f'Requested range not satisfiable: {range_header}')
+		if result['StatusCode'] == 412:
+			raise HTTPException(status_code = 412, detail = 'Precondition failed')
+
+		headers = {
+			'Accept-Ranges': 'bytes',
+			'Content-Length': str(result['ContentLength']),
+			'ETag': result['ETag'],
+			'Last-Modified': format_datetime(result['LastModified'].astimezone(timezone.utc), usegmt = True)
+			}
+		if result.get('ContentRange'):
+			headers['Content-Range'] = result['ContentRange']
+		headers.update(vary)
+
+		# Stream the S3 body to the client chunk by chunk
+		return StreamingResponse(
+			iter_s3_body(result['Body']),
+			status_code = result['StatusCode'],
+			media_type = guess_media_type(s3_key, result.get('ContentType')),
+			headers = headers
+			)
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Photo of one friend by ID (original or rendition) ===
+@app.get('/friends/{friend_id}/photo')
+async def get_friend_photo(
+	friend_id: str,
+	size: Optional[Literal['thumb', 'medium']] = Query(None, description = 'Rendition to serve; omit for the original'),
+	redirect: bool = Query(MEDIA_REDIRECT, description = 'Answer with a 307 to a presigned S3 URL'),
+	accept: Optional[str] = Header(None)
+	):
+	try:
+		result = await get_one_friend(friend_id)
+		if not result:
+			raise HTTPException(status_code = 404, detail = f'No found friend: {friend_id}')
+		return await get_photo_file(
+			s3_key = result['S3Key'],
+			range_header = None,
+			if_none_match = None,
+			if_modified_since = None,
+			redirect = redirect,
+			size = size,
+			accept = accept
+			)
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Remember the Telegram file_id of a friend's photo ===
+@app.put('/friends/{friend_id}/telegram_file', response_model = FriendResponse)
+async def put_telegram_file(friend_id: str, telegram_file: TelegramFile):
+	try:
+		if not await get_one_friend(friend_id):
+			raise HTTPException(status_code = 404, detail = f'No found friend: {friend_id}')
+		result = await set_telegram_file_id(friend_id, telegram_file.file_id)
+		if not result:
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error when storing Telegram file_id')
+		return result
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
 
-		# Return file as a byte stream
-		return StreamingResponse(BytesIO(file_content), media_type=content_type)
+
+# === Helper: open the similarity index on first use, rebuild it in the background ===
+async def ensure_similarity_index() -> None:
+	"""
+	The index is shared on disk by all workers and loaded on first use; it is
+	rebuilt from the table once older than SIMILARITY_INDEX_REFRESH, which
+	also repairs writes that raced with an earlier rebuild.
+	"""
+	if not similarity_index.is_open:
+		if not await asyncio.shield(shared_index_task('similarity', open_similarity_index)):
+			raise HTTPException(status_code = 500, detail = 'Error opening similarity index')
+	elif time.time() - similarity_index.built_at > SIMILARITY_INDEX_REFRESH:
+		shared_index_task('similarity', lambda: open_similarity_index(rebuild = True))
+
+
+
+# === ENDPOINT: Friends doing similar work (by profession description) ===
+@app.get('/friends/{friend_id}/similar', response_model = List[SimilarFriend])
+async def get_similar_friends(friend_id: str, k: int = Query(10, ge = 1, le = MAX_SIMILAR_FRIENDS)):
+	try:
+		friend = await get_one_friend(friend_id)
+		if not friend:
+			raise HTTPException(status_code = 404, detail = f'No found friend: {friend_id}')
+		await ensure_similarity_index()
+
+		neighbours = await run_in_threadpool(similarity_index.similar, friend_id, k)
+		if neighbours is None:
+			# Created by another process since the index was built
+			await run_in_threadpool(similarity_index.add, friend)
+			neighbours = await run_in_threadpool(similarity_index.similar, friend_id, k)
+			if neighbours is None:
+				# Deleted by another process in the meantime
+				raise HTTPException(status_code = 404, detail = f'No found friend: {friend_id}')
+
+		friends = await get_friends_by_ids([neighbour_id for neighbour_id, _ in neighbours if neighbour_id])
+		if friends is None:
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error during batch read')
+		return [
+			{**friends[neighbour_id], 'Similarity': score}
+			for neighbour_id, score in neighbours
+			if neighbour_id in friends
+		]
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
 
@@ -119,7 +748,7 @@ def get_photo_file(s3_key: str):
 async def answer_to_question(friend_id: str, question: Questions):
 	try:
 		# Retrieve friend record from DB
-		result = get_one_friend(friend_id)
+		result = await get_one_friend(friend_id)
 		if not result:
 			raise HTTPException(status_code = 404,detail = f'No found friend: {friend_id}')
 
@@ -127,6 +756,129 @@ async def answer_to_question(friend_id: str, question: Questions):
 		ai_menager = AIManager(question.question, result)
 		answer = await ai_menager.answers_to_questions()
 		return answer
+	except HTTPException:
+		raise
+	except LLMBusyError as e:
+		raise HTTPException(status_code = 503, detail = f'AI is busy, try again later: {e}')
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === Helper: format AI answer pieces as server-sent events ===
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+	prefix = f'event: {event}\n' if event else ''
+	return f'{prefix}data: {json.dumps(data, ensure_ascii = False)}\n\n'
+
+
+async def iter_answer_events(first_piece: Optional[str], pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+	try:
+		if first_piece:
+			yield sse_event({'delta': first_piece})
+		async for piece in pieces:
+			yield sse_event({'delta': piece})
+		yield sse_event({}, event = 'done')
+	except Exception as e:
+		# Headers are already sent, so the error goes out as an event
+		logging.error(f'AI answer stream aborted: {e}')
+		yield sse_event({'detail': str(e)}, event = 'error')
+	finally:
+		await pieces.aclose()
+
+
+
+# === ENDPOINT: Stream AI answer about friend's profession as server-sent events ===
+@app.post('/friends/{friend_id}/ask/stream')
+async def stream_answer_to_question(friend_id: str, question: Questions):
+	try:
+		# Retrieve friend record from DB
+		result = await get_one_friend(friend_id)
+		if not result:
+			raise HTTPException(status_code = 404,detail = f'No found friend: {friend_id}')
+
+		# Wait for the first piece so queueing and upstream errors still get a proper status
+		pieces = AIManager(question.question, result).stream_answer()
+		try:
+			first_piece = await pieces.__anext__()
+		except StopAsyncIteration:
+			first_piece = None
+
+		return StreamingResponse(
+			iter_answer_events(first_piece, pieces),
+			media_type = 'text/event-stream',
+			headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+			)
+	except HTTPException:
+		raise
+	except LLMBusyError as e:
+		raise HTTPException(status_code = 503, detail = f'AI is busy, try again later: {e}')
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'AI error: {e}')
+
+
+
+# === ENDPOINT: Ask many questions about many friends in one call ===
+@app.post('/friends/ask/batch', response_model = List[BatchAnswer])
+async def answer_batch_questions(batch: BatchQuestions):
+	try:
+		# Fetch every referenced friend at once
+		friends = await get_friends_by_ids([item.friend_id for item in batch.items])
+		if friends is None:
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error during batch read')
+
+		# Identical prompts (same profession and normalized question) share one task
+		semaphore = asyncio.Semaphore(BATCH_AI_CONCURRENCY)
+		prompts: Dict[str, asyncio.Task] = {}
+
+		async def generate(ai_menager: AIManager) -> Optional[str]:
+			async with semaphore:
+				return await ai_menager.answers_to_questions()
+
+		async def resolve(index: int, friend_id: str, question: str, task: Optional[asyncio.Task]) -> dict:
+			result = {'index': index, 'FriendID': friend_id, 'question': question, 'answer': None, 'error': None}
+			if task is None:
+				result['error'] = f'No found friend: {friend_id}'
+				return result
+			try:
+				result['answer'] = await asyncio.shield(task)
+				if result['answer'] is None:
+					result['error'] = 'AI error'
+			except LLMBusyError as e:
+				result['error'] = f'AI is busy, try again later: {e}'
+			except Exception as e:
+				result['error'] = f'AI error: {e}'
+			return result
+
+		pending = []
+		for index, item in enumerate(batch.items):
+			task = None
+			if item.friend_id in friends:
+				ai_menager = AIManager(item.question, friends[item.friend_id])
+				task = prompts.get(ai_menager.cache_key())
+				if task is None:
+					task = prompts[ai_menager.cache_key()] = asyncio.ensure_future(generate(ai_menager))
+			pending.append(resolve(index, item.friend_id, item.question, task))
+
+		if not batch.stream:
+			try:
+				return await asyncio.gather(*pending)
+			finally:
+				for task in prompts.values():
+					task.cancel()
+
+		# Stream one NDJSON line per item as soon as its answer is ready
+		async def iter_results() -> AsyncIterator[str]:
+			try:
+				for finished in asyncio.as_completed(pending):
+					result = BatchAnswer.model_validate(await finished).model_dump(by_alias = True)
+					yield json.dumps(result, ensure_ascii = False) + '\n'
+			finally:
+				for task in prompts.values():
+					task.cancel()
+
+		return StreamingResponse(iter_results(), media_type = 'application/x-ndjson')
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
 
@@ -134,19 +886,66 @@ async def answer_to_question(friend_id: str, question: Questions):
 
 # === ENDPOINT: Delete a friend (record + photo) ===
 @app.delete('/friends/delete/{friend_id}', response_model = str)
-def delete_one_friend(friend_id: str):
+async def delete_one_friend(friend_id: str):
 	try:
 		# Check if friend exists
-		result = get_one_friend(friend_id)
+		result = await get_one_friend(friend_id)
 		if result:
 			# Delete record from DynamoDB
-			x = delete_friend(friend_id)
+			x = await delete_friend(friend_id)
 
-			# Delete photo from S3
+			# Delete photo and its resized renditions from S3
 			s3_key = result.get('S3Key')
-			y = delete_file_from_s3(s3_key)
+			y = await delete_file_from_s3(s3_key)
+			await delete_files_from_s3(all_derivative_keys(s3_key))
 
 			# Return confirmation message
 			return f'Friend: {friend_id} has been deleted'
+	except HTTPException:
+		raise
 	except Exception as e:
 		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Delete many friends (records + photos) ===
+@app.post('/friends/delete/batch', response_model = BatchDeleteResult)
+async def delete_many_friends(request: FriendIDs):
+	try:
+		# One batch read gives the photo keys (batch deletes cannot return the old items)
+		friend_ids = list(dict.fromkeys(request.ids))
+		found = await get_friends_by_ids(friend_ids)
+		if found is None:
+			raise HTTPException(status_code = 500, detail = 'DynamoDB error during batch read')
+
+		# Delete records in 25-item batch writes
+		failed = set(await batch_delete_friends(list(found)))
+		deleted = [friend_id for friend_id in found if friend_id not in failed]
+
+		# Delete photos and their resized renditions, 1000 keys per S3 call
+		s3_keys = []
+		for friend_id in deleted:
+			s3_key = found[friend_id].get('S3Key')
+			if s3_key:
+				s3_keys.append(s3_key)
+				s3_keys.extend(all_derivative_keys(s3_key))
+		failed_keys = await delete_files_from_s3(s3_keys)
+		if failed_keys:
+			logging.error(f'{len(failed_keys)} S3 objects left behind by batch delete')
+
+		return {
+			'deleted': deleted,
+			'not_found': [friend_id for friend_id in friend_ids if friend_id not in found],
+			'failed': [friend_id for friend_id in found if friend_id in failed]
+			}
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code = 500, detail = f'DB error: {e}')
+
+
+
+# === ENDPOINT: Cache statistics ===
+@app.get('/metrics/cache')
+async def get_cache_metrics():
+	return {'friends': friend_cache.stats(), 'answers': await run_in_threadpool(answer_cache.stats)}
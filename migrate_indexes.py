@@ -0,0 +1,141 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from botocore.exceptions import ClientError
+from database import OWNER_INDEX_NAME, PROFESSION_INDEX_NAME, TABLE_NAME, dynamo_db, scan_all_friends, table
+from search_index import normalize_profession
+'''
+Creates the friends table's secondary indexes and backfills the attributes
+they are keyed on for items written before the index existed.
+
+    python migrate_indexes.py --default-owner legacy
+
+OwnerIndex (OwnerID) serves GET /friends?owner=, ProfessionIndex (ProfessionNorm,
+the normalized profession) serves GET /friends/search?profession=.
+
+Run it once per table; it is safe to re-run (existing indexes are kept and
+only items missing the attribute are updated).
+'''
+
+INDEX_WAIT_INTERVAL = 10
+
+
+def ensure_index(index_name: str, attribute: str, wait: bool = True) -> bool:
+    """
+    Creates a global secondary index with `attribute` as its hash key (all
+    attributes projected) unless it already exists, then waits until it is
+    ACTIVE. Returns True if the index was created.
+    """
+    client = dynamo_db.meta.client
+    description = client.describe_table(TableName=TABLE_NAME)['Table']
+    existing = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+    created = index_name not in existing
+
+    if created:
+        index: Dict[str, Any] = {
+            'IndexName': index_name,
+            'KeySchema': [{'AttributeName': attribute, 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+        # Provisioned tables need a throughput for the new index as well
+        if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+            throughput = description['ProvisionedThroughput']
+            index['ProvisionedThroughput'] = {
+                'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+                'WriteCapacityUnits': throughput['WriteCapacityUnits']
+            }
+        client.update_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[{'AttributeName': attribute, 'AttributeType': 'S'}],
+            GlobalSecondaryIndexUpdates=[{'Create': index}]
+        )
+        logging.info(f'Creating index {index_name} on {attribute}')
+
+    while wait:
+        indexes = client.describe_table(TableName=TABLE_NAME)['Table'].get('GlobalSecondaryIndexes', [])
+        status = next((index['IndexStatus'] for index in indexes if index['IndexName'] == index_name), None)
+        if status == 'ACTIVE':
+            break
+        logging.info(f'Index {index_name} is {status}, waiting...')
+        time.sleep(INDEX_WAIT_INTERVAL)
+    return created
+
+
+def set_missing_attribute(friend_id: str, attribute: str, value: str) -> bool:
+    """
+    Sets the attribute on one existing item unless it is already set (a
+    concurrent write by the API wins). Returns True if the item was updated.
+    """
+    try:
+        table.update_item(
+            Key={'FriendID': friend_id},
+            UpdateExpression='SET #attribute = :value',
+            ConditionExpression='attribute_exists(FriendID) AND attribute_not_exists(#attribute)',
+            ExpressionAttributeNames={'#attribute': attribute},
+            ExpressionAttributeValues={':value': value}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def backfill(
+    attribute: str,
+    value_for: Callable[[Dict[str, Any]], Optional[str]],
+    workers: int = 8,
+    dry_run: bool = False
+    ) -> Dict[str, int]:
+    """
+    Sets `attribute` to value_for(item) on every item that lacks it, reading
+    the table with the parallel segmented scan.
+    """
+    counts = {'scanned': 0, 'missing': 0, 'updated': 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for item in scan_all_friends():
+            counts['scanned'] += 1
+            if item.get(attribute):
+                continue
+            value = value_for(item)
+            if not value:
+                continue
+            counts['missing'] += 1
+            if not dry_run:
+                futures.append(executor.submit(set_missing_attribute, item['FriendID'], attribute, value))
+        counts['updated'] = sum(1 for future in futures if future.result())
+    return counts
+
+
+def backfill_owner(default_owner: str, workers: int = 8, dry_run: bool = False) -> Dict[str, int]:
+    return backfill('OwnerID', lambda item: default_owner, workers, dry_run)
+
+
+def backfill_profession_norm(workers: int = 8, dry_run: bool = False) -> Dict[str, int]:
+    return backfill('ProfessionNorm', lambda item: normalize_profession(item.get('Profession') or ''), workers, dry_run)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description='Create secondary indexes on the friends table and backfill their keys.')
+    parser.add_argument('--default-owner', help='OwnerID given to existing friends without one (skip backfill if omitted)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent update_item calls during backfill')
+    parser.add_argument('--skip-index', action='store_true', help='Only backfill; do not create indexes')
+    parser.add_argument('--dry-run', action='store_true', help='Count items to backfill without writing')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not args.skip_index and not args.dry_run:
+        ensure_index(OWNER_INDEX_NAME, 'OwnerID')
+        ensure_index(PROFESSION_INDEX_NAME, 'ProfessionNorm')
+    logging.info(f'ProfessionNorm backfill: {backfill_profession_norm(args.workers, args.dry_run)}')
+    if args.default_owner:
+        counts = backfill_owner(args.default_owner, args.workers, args.dry_run)
+        logging.info(f'OwnerID backfill: {counts}')
+
+
+if __name__ == '__main__':
+    main()
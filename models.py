@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -15,6 +16,8 @@ class FriendResponse(FriendCreate):
 	friend_id: str = Field(..., alias = 'FriendID') 
 	S3Key: str 
 	PhotoUrl: str 
+	OwnerID: Optional[str] = None
+	TelegramFileID: Optional[str] = None
 	model_config = ConfigDict(
         populate_by_name=True,
         from_attributes=True
@@ -22,4 +25,76 @@ class FriendResponse(FriendCreate):
 
 
 class Questions(BaseModel):
-	question: str
\ No newline at end of file
+	question: str
+
+
+class FriendPage(BaseModel):
+	items: List[FriendResponse]
+	next_cursor: Optional[str] = None
+
+
+class SimilarFriend(FriendResponse):
+	Similarity: float
+
+
+class TelegramFile(BaseModel):
+	file_id: str = Field(..., alias = 'FileID', min_length = 1)
+	model_config = ConfigDict(populate_by_name=True)
+
+
+class FriendIDs(BaseModel):
+	ids: List[str] = Field(..., min_length = 1, max_length = 1000)
+
+
+class BatchDeleteResult(BaseModel):
+	deleted: List[str]
+	not_found: List[str]
+	failed: List[str]
+
+
+class PhotoUploadRequest(BaseModel):
+	filename: str
+	content_type: str
+
+
+class PhotoUploadTicket(BaseModel):
+	friend_id: str
+	s3_key: str
+	upload_url: str
+	upload_fields: Dict[str, str]
+	expires_in: int
+
+
+class PhotoUploadComplete(FriendCreate):
+	s3_key: str = Field(..., alias = 'S3Key')
+
+
+class BatchQuestion(BaseModel):
+	friend_id: str = Field(..., alias = 'FriendID')
+	question: str
+	model_config = ConfigDict(populate_by_name=True)
+
+
+class BatchQuestions(BaseModel):
+	items: List[BatchQuestion] = Field(..., min_length = 1, max_length = 100)
+	stream: bool = False
+
+
+class BatchAnswer(BaseModel):
+	index: int
+	friend_id: str = Field(..., alias = 'FriendID')
+	question: str
+	answer: Optional[str] = None
+	error: Optional[str] = None
+	model_config = ConfigDict(populate_by_name=True)
+
+
+class FriendImport(FriendCreate):
+	photo: str = Field(..., alias = 'Photo')
+
+
+class FriendImportResult(BaseModel):
+	index: int
+	status: str
+	friend: Optional[FriendResponse] = None
+	error: Optional[str] = None
@@ -0,0 +1,163 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+'''
+In-process search index over friends' Name and Profession. Every word is
+case-folded into a token; an inverted index maps tokens to FriendIDs and a
+sorted token list answers prefix lookups with two binary searches, so a query
+touches only the matching tokens no matter how many friends are indexed.
+'''
+
+TOKEN_PATTERN = re.compile(r'\w+')
+SEARCH_FIELDS = ('Name', 'Profession')
+
+# Upper bound for prefix ranges in the sorted token list
+PREFIX_END = '\U0010ffff'
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def normalize_profession(profession: str) -> str:
+    """
+    Case-folded profession with single spaces, used for exact profession
+    matches (the ProfessionNorm attribute).
+    """
+    return ' '.join(tokenize(profession))
+
+
+def matches_query(item: Dict[str, Any], query: str) -> bool:
+    """
+    True if, for every query word, the item's Name or Profession has a word
+    starting with it (the index's matching rule, for a single item).
+    """
+    tokens = {token for field in SEARCH_FIELDS for token in tokenize(item.get(field) or '')}
+    return all(any(token.startswith(word) for token in tokens) for word in tokenize(query))
+
+
+class SearchIndex:
+    """
+    Thread-safe token-prefix index. Queries match friends whose Name or
+    Profession has, for every query word, a word starting with it.
+    """
+
+    def __init__(self):
+        self.built_at: Optional[float] = None
+        self._postings: Dict[str, Set[str]] = {}
+        self._tokens: List[str] = []
+        self._friends: Dict[str, Dict[str, Any]] = {}
+        self._friend_tokens: Dict[str, Set[str]] = {}
+        # Changes made while a rebuild is scanning, replayed onto the new index
+        self._pending: Optional[List[Tuple[str, Any]]] = None
+        self._lock = threading.Lock()
+        # Held for a whole build so overlapping builds run one after another
+        self._build_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._friends)
+
+    def _add(self, item: Dict[str, Any]) -> None:
+        friend_id = item['FriendID']
+        self._remove(friend_id)
+        tokens = {token for field in SEARCH_FIELDS for token in tokenize(item.get(field) or '')}
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            postings.add(friend_id)
+        self._friends[friend_id] = dict(item)
+        self._friend_tokens[friend_id] = tokens
+
+    def _remove(self, friend_id: str) -> None:
+        for token in self._friend_tokens.pop(friend_id, ()):
+            postings = self._postings[token]
+            postings.discard(friend_id)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+        self._friends.pop(friend_id, None)
+
+    def add(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            self._add(item)
+            if self._pending is not None:
+                self._pending.append(('add', item))
+
+    def remove(self, friend_id: str) -> None:
+        with self._lock:
+            self._remove(friend_id)
+            if self._pending is not None:
+                self._pending.append(('remove', friend_id))
+
+    def build(self, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replaces the index contents with `items` (e.g. a table scan). Adds and
+        removes made while `items` is being read are applied on top.
+        """
+        with self._build_lock:
+            self._build(items)
+
+    def _build(self, items: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._pending = []
+        fresh = SearchIndex()
+        try:
+            for item in items:
+                fresh._add(item)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for action, value in self._pending:
+                if action == 'add':
+                    fresh._add(value)
+                else:
+                    fresh._remove(value)
+            self._pending = None
+            self._postings = fresh._postings
+            self._tokens = fresh._tokens
+            self._friends = fresh._friends
+            self._friend_tokens = fresh._friend_tokens
+            self.built_at = time.monotonic()
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + PREFIX_END, start)
+        matches: Set[str] = set()
+        for token in self._tokens[start:end]:
+            matches |= self._postings[token]
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` matching friends, those matching the query words
+        exactly (not just as prefixes) first, then by Name.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            matches: Optional[Set[str]] = None
+            for word in sorted(set(words), key=len, reverse=True):
+                found = self._prefix_matches(word)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    return []
+            ranked = heapq.nsmallest(
+                limit,
+                matches,
+                key=lambda friend_id: (
+                    -sum(word in self._friend_tokens[friend_id] for word in words),
+                    (self._friends[friend_id].get('Name') or '').casefold()
+                )
+            )
+            return [dict(self._friends[friend_id]) for friend_id in ranked]
+
+
+search_index = SearchIndex()
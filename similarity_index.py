@@ -0,0 +1,342 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from search_index import tokenize
+'''
+Local "similar work" index over friends' ProfessionDescription. Every
+description becomes a hashed bag of words (1.0 in the hash bucket of each
+word) and similarity is the cosine of these vectors weighted by IDF, so words
+shared by everyone count little. Vectors are the columns of a float32
+(dimensions x friends) matrix: a query reads only the rows of its own words.
+The matrix, the FriendID of every column and the number of friends having each
+word bucket (for the IDF) live in memory-mapped files under
+SIMILARITY_INDEX_PATH, are updated in place on create/delete, and are loaded
+back without a table scan after a restart. Several processes can share the
+path: writes are serialized with a file lock and bump a generation number in
+the metadata, and every process reloads its view when that number changes.
+'''
+
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', 'similarity_index')
+SIMILARITY_DIMENSIONS = int(os.getenv('SIMILARITY_DIMENSIONS', 1024))
+
+INITIAL_CAPACITY = 1024
+ID_DTYPE = np.dtype('S64')
+
+VECTORS_FILE = 'vectors.f32'
+IDS_FILE = 'ids.bin'
+DF_FILE = 'df.f64'
+META_FILE = 'meta.json'
+LOCK_FILE = 'lock'
+
+
+def hash_buckets(text: str, dimensions: int = SIMILARITY_DIMENSIONS) -> np.ndarray:
+    """
+    Hash buckets of the words of `text`. crc32 keeps them stable across
+    processes, which the persisted vectors rely on.
+    """
+    return np.unique(np.array([zlib.crc32(token.encode()) % dimensions for token in tokenize(text)], dtype=np.intp))
+
+
+class SimilarityIndex:
+    """
+    Thread-safe matrix of description vectors, on disk when `path` is set.
+    Until the index is built or loaded, adds and removes are ignored: the
+    first build scans the table anyway. Changes made while a build is
+    scanning are applied on top of it.
+    """
+
+    def __init__(self, path: Optional[str] = SIMILARITY_INDEX_PATH, dimensions: int = SIMILARITY_DIMENSIONS):
+        self.path = path
+        self.dimensions = dimensions
+        self.built_at: Optional[float] = None
+        self._count = 0
+        self._vectors = np.zeros((dimensions, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=ID_DTYPE)
+        self._columns: Dict[str, int] = {}
+        self._df = np.zeros(dimensions, dtype=np.float64)
+        # IDF-weighted column norms, recomputed on the first query after a change
+        self._norms: Optional[np.ndarray] = None
+        # Generation of the saved index this process's view matches
+        self._generation: Optional[int] = None
+        self._pending: Optional[List[Tuple[str, str, Optional[str]]]] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def is_open(self) -> bool:
+        return self.built_at is not None
+
+    # --- storage ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _map(self, capacity: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r+', shape=(self.dimensions, capacity))
+        ids = np.memmap(self._file(IDS_FILE), dtype=ID_DTYPE, mode='r+', shape=(capacity,))
+        df = np.memmap(self._file(DF_FILE), dtype=np.float64, mode='r+', shape=(self.dimensions,))
+        return vectors, ids, df
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        """
+        Metadata of the saved index, or None if there is no usable one (none
+        yet, other dimensions, or files being replaced by a writer).
+        """
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(META_FILE)) as f:
+                meta = json.load(f)
+            capacity = meta['capacity']
+            if (
+                meta['dimensions'] != self.dimensions
+                or os.path.getsize(self._file(VECTORS_FILE)) != capacity * 4 * self.dimensions
+                or os.path.getsize(self._file(IDS_FILE)) != capacity * ID_DTYPE.itemsize
+                or os.path.getsize(self._file(DF_FILE)) != 8 * self.dimensions
+            ):
+                return None
+            return meta
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _sync(self) -> None:
+        """
+        Reloads this process's view when a newer generation has been saved.
+        """
+        meta = self._read_meta()
+        if meta is None or meta['generation'] == self._generation:
+            return
+        try:
+            vectors, ids, df = self._map(meta['capacity'])
+        except (OSError, ValueError):
+            # Replaced by a writer in the meantime; the next call catches up
+            return
+        count = meta['count']
+        self._vectors, self._ids, self._df = vectors, ids, df
+        self._count = count
+        self._columns = {friend_id.decode(): column for column, friend_id in enumerate(ids[:count])}
+        self._norms = None
+        self.built_at = meta['built_at']
+        self._generation = meta['generation']
+
+    def _commit(self) -> None:
+        """
+        Flushes the matrix and saves the metadata under the next generation.
+        """
+        if self.path is None:
+            return
+        self._vectors.flush()
+        self._ids.flush()
+        self._df.flush()
+        self._generation = (self._generation or 0) + 1
+        meta = {
+            'dimensions': self.dimensions,
+            'count': self._count,
+            'capacity': len(self._ids),
+            'built_at': self.built_at,
+            'generation': self._generation
+        }
+        with open(self._file(META_FILE + '.tmp'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(self._file(META_FILE + '.tmp'), self._file(META_FILE))
+
+    @contextmanager
+    def _locked(self, operation: int):
+        """
+        Holds the thread lock and, on disk, the file lock shared by all
+        processes (`fcntl.LOCK_EX` or `LOCK_SH`), with this process's view
+        synced to the saved index.
+        """
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file(LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, operation)
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _writing(self):
+        return self._locked(fcntl.LOCK_EX)
+
+    def _reading(self):
+        # Other processes' writers change the mapped files in place
+        return self._locked(fcntl.LOCK_SH)
+
+    def _write_all(self, vectors: np.ndarray, ids: np.ndarray, df: np.ndarray) -> None:
+        """
+        Replaces the files with `vectors`/`ids`/`df` (written aside, then
+        renamed, so readers keep their old mapping until they sync).
+        """
+        for name, array in ((VECTORS_FILE, vectors), (IDS_FILE, ids), (DF_FILE, df)):
+            np.ascontiguousarray(array).tofile(self._file(name + '.tmp'))
+            os.replace(self._file(name + '.tmp'), self._file(name))
+        self._vectors, self._ids, self._df = self._map(len(ids))
+
+    def _grow(self) -> None:
+        capacity = max(INITIAL_CAPACITY, 2 * len(self._ids))
+        vectors = np.zeros((self.dimensions, capacity), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=ID_DTYPE)
+        vectors[:, :self._count] = self._vectors[:, :self._count]
+        ids[:self._count] = self._ids[:self._count]
+        if self.path is None:
+            self._vectors, self._ids = vectors, ids
+        else:
+            self._write_all(vectors, ids, self._df)
+
+    # --- changes ---
+
+    def _clear_column(self, column: int) -> None:
+        buckets = np.flatnonzero(self._vectors[:, column])
+        self._vectors[buckets, column] = 0
+        self._df[buckets] -= 1
+
+    def _add(self, friend_id: str, description: str) -> None:
+        column = self._columns.get(friend_id)
+        if column is None:
+            if self._count == len(self._ids):
+                self._grow()
+            column = self._count
+            self._count += 1
+            self._columns[friend_id] = column
+            self._ids[column] = friend_id.encode()
+        else:
+            self._clear_column(column)
+        # Only the word buckets are written, so an add touches a few pages of the file
+        buckets = hash_buckets(description, self.dimensions)
+        self._vectors[buckets, column] = 1
+        self._df[buckets] += 1
+        self._norms = None
+
+    def _remove(self, friend_id: str) -> None:
+        column = self._columns.pop(friend_id, None)
+        if column is None:
+            return
+        self._clear_column(column)
+        # Move the last column into the gap so columns stay contiguous
+        last = self._count - 1
+        if column != last:
+            buckets = np.flatnonzero(self._vectors[:, last])
+            self._vectors[buckets, column] = 1
+            self._vectors[buckets, last] = 0
+            self._ids[column] = self._ids[last]
+            self._columns[self._ids[column].decode()] = column
+        self._ids[last] = b''
+        self._count = last
+        self._norms = None
+
+    def _replay(self) -> None:
+        for action, friend_id, description in self._pending:
+            if action == 'add':
+                self._add(friend_id, description)
+            else:
+                self._remove(friend_id)
+        self._pending = None
+
+    def add(self, item: Dict[str, Any]) -> None:
+        description = item.get('ProfessionDescription') or ''
+        with self._writing():
+            if self._pending is not None:
+                self._pending.append(('add', item['FriendID'], description))
+            if self.is_open:
+                self._add(item['FriendID'], description)
+                self._commit()
+
+    def remove(self, friend_id: str) -> None:
+        with self._writing():
+            if self._pending is not None:
+                self._pending.append(('remove', friend_id, None))
+            if self.is_open:
+                self._remove(friend_id)
+                self._commit()
+
+    # --- loading ---
+
+    def load(self) -> bool:
+        """
+        Opens the index saved under `path` (by this or another process).
+        Returns False if there is none or it was saved with other dimensions.
+        """
+        with self._reading():
+            return self.is_open
+
+    def build(self, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replaces the index contents with `items` (e.g. a table scan). Adds and
+        removes made by this process while `items` is being read are applied
+        on top; the periodic rebuild repairs any made by others meanwhile.
+        """
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            fresh = SimilarityIndex(path=None, dimensions=self.dimensions)
+            try:
+                for item in items:
+                    fresh._add(item['FriendID'], item.get('ProfessionDescription') or '')
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            if fresh._count == len(fresh._ids):
+                fresh._grow()
+            with self._writing():
+                fresh._pending, self._pending = self._pending, None
+                fresh._replay()
+                if self.path is None:
+                    self._vectors, self._ids, self._df = fresh._vectors, fresh._ids, fresh._df
+                else:
+                    self._write_all(fresh._vectors, fresh._ids, fresh._df)
+                self._count = fresh._count
+                self._columns = fresh._columns
+                self._norms = None
+                self.built_at = time.time()
+                self._commit()
+
+    # --- queries ---
+
+    def similar(self, friend_id: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """
+        The `k` friends whose descriptions are closest to this friend's, as
+        (FriendID, cosine similarity) pairs, best first; friends sharing no
+        words are left out. None if the friend is not in the index.
+        """
+        with self._reading():
+            column = self._columns.get(friend_id)
+            if column is None:
+                return None
+            count = self._count
+            vectors = self._vectors[:, :count]
+            idf = np.log((1 + count) / (1 + self._df)) + 1
+            weights = (idf * idf).astype(np.float32)
+            if self._norms is None:
+                self._norms = np.sqrt(weights @ vectors)
+
+            # Dot products with every friend from the rows of this friend's words only
+            buckets = np.flatnonzero(vectors[:, column])
+            dots = weights[buckets] @ vectors[buckets]
+            norms = self._norms * self._norms[column]
+            scores = np.divide(dots, norms, out=np.zeros(count, dtype=np.float32), where=norms > 0)
+            scores[column] = 0
+
+            k = min(k, int(np.count_nonzero(scores > 0)))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self._ids[i].decode(), round(float(scores[i]), 4)) for i in top]
+
+
+similarity_index = SimilarityIndex()
@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from main import app
@@ -55,6 +56,25 @@ def test_invalid_file():
     assert response.status_code == 422
 
 
+# ============================================================
+# Test: Oversized photo is rejected without creating a record
+# ============================================================
+def test_file_too_large():
+    test_file_content = b"\xFF\xD8\xFF\xE0" + b"\x00" * (8 * 1024 * 1024)
+
+    files = {'photo': ('huge.jpg', test_file_content, 'image/jpeg')}
+    data = {
+        "name": "Тест-Завеликий",
+        "profession": "Тестувальник",
+        "profession_description": "Надто велике фото"
+    }
+    response = client.post("/friends", data=data, files=files)
+    assert response.status_code == 400
+
+    friends_list = client.get('friends', params={'all': 'true'}).json()['items']
+    assert "Тест-Завеликий" not in [f['Name'] for f in friends_list]
+
+
 # ============================================================
 # Test: Attempt to create friend with missing required fields
 # ============================================================
@@ -71,6 +91,20 @@ def test_invalid_data():
     assert response.status_code == 422
 
 
+# ============================================================
+# Test: Direct-to-S3 upload ticket is issued only for allowed types
+# ============================================================
+def test_start_photo_upload():
+    response = client.post('/friends/uploads', json={'filename': 'alice.jpg', 'content_type': 'image/jpeg'})
+    assert response.status_code == 200
+    ticket = response.json()
+    assert ticket['s3_key'].endswith(f"{ticket['friend_id']}/alice.jpg")
+    assert ticket['upload_fields']['Content-Type'] == 'image/jpeg'
+
+    response = client.post('/friends/uploads', json={'filename': 'alice.txt', 'content_type': 'text/plain'})
+    assert response.status_code == 400
+
+
 # ============================================================
 # Test: Get all friend records and verify that created ones exist
 # ============================================================
@@ -90,13 +124,26 @@ def test_get_all_records():
     global friend_id_roman
     friend_id_roman = friend_id_roman1
 
-    # Retrieve all friends from the API
-    response = client.get('friends')
-    assert response.status_code == 200
+    # Retrieve all friends from the API page by page
+    friends_list = []
+    cursor = None
+    while True:
+        params = {'limit': 50}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('friends', params=params)
+        assert response.status_code == 200
+
+        # Validate page structure
+        page = response.json()
+        assert isinstance(page['items'], list)
+        assert len(page['items']) <= 50
+        friends_list.extend(page['items'])
+
+        cursor = page['next_cursor']
+        if not cursor:
+            break
 
-    # Validate structure and data
-    friends_list = response.json()
-    assert isinstance(friends_list, list)
     added_names = ["Тест-Аліса", "Тест-Роман"]
     retrieved_names = [f['Name'] for f in friends_list]
 
@@ -105,6 +152,128 @@ def test_get_all_records():
     assert added_names[1] in retrieved_names
 
 
+# ============================================================
+# Test: Full list is only returned on explicit opt-in
+# ============================================================
+def test_get_all_records_opt_in():
+    response = client.get('friends', params={'all': 'true'})
+    assert response.status_code == 200
+    assert response.json()['next_cursor'] is None
+
+
+# ============================================================
+# Test: Export streams created friends as NDJSON and CSV
+# ============================================================
+def test_export_friends():
+    response = client.get('/friends/export', params={'format': 'ndjson'})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    exported_ids = [json.loads(line)['FriendID'] for line in response.text.splitlines()]
+    assert friend_id_alice in exported_ids
+
+    response = client.get('/friends/export', params={'format': 'csv'})
+    assert response.status_code == 200
+    assert response.text.startswith('FriendID,Name,Profession')
+
+
+# ============================================================
+# Test: Photo supports byte ranges and conditional requests
+# ============================================================
+def test_get_photo_range():
+    s3_key = client.get(f'/friends/{friend_id_alice}').json()['S3Key']
+
+    response = client.get(f'/media/{s3_key}', headers={'Range': 'bytes=0-1'})
+    assert response.status_code == 206
+    assert response.content == b"\xFF\xD8"
+    assert response.headers['content-range'] == 'bytes 0-1/4'
+
+    etag = response.headers['etag']
+    response = client.get(f'/media/{s3_key}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+# ============================================================
+# Test: Malformed pagination cursor is rejected
+# ============================================================
+def test_invalid_cursor():
+    response = client.get('friends', params={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+
+
+# ============================================================
+# Test: Word search is a single page, cursors are for profession searches
+# ============================================================
+def test_search_paging():
+    response = client.get('/friends/search', params={'q': 'Тест-Аліса', 'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+
+    response = client.get('/friends/search', params={'profession': 'тестувальник', 'q': 'Тест-Аліса', 'limit': 1})
+    assert response.status_code == 200
+    assert [f['FriendID'] for f in response.json()['items']] == [friend_id_alice]
+
+
+# ============================================================
+# Test: Telegram file_id is stored on the friend record
+# ============================================================
+def test_store_telegram_file_id():
+    response = client.put(f'/friends/{friend_id_alice}/telegram_file', json={'file_id': 'AgACAgIAAxkBAAIB'})
+    assert response.status_code == 200
+    assert response.json()['TelegramFileID'] == 'AgACAgIAAxkBAAIB'
+    assert client.get(f'/friends/{friend_id_alice}').json()['TelegramFileID'] == 'AgACAgIAAxkBAAIB'
+
+    response = client.put('/friends/missing-id/telegram_file', json={'file_id': 'AgACAgIAAxkBAAIB'})
+    assert response.status_code == 404
+
+
+# ============================================================
+# Test: Friend with a punctuation-only profession is created
+# ============================================================
+def test_create_friend_with_blank_profession():
+    files = {'photo': ('blank.jpg', b"\xFF\xD8\xFF\xE0", 'image/jpeg')}
+    data = {"name": "Тест-Без-Професії", "profession": "---", "profession_description": "Немає професії"}
+    response = client.post("/friends", data=data, files=files)
+    assert response.status_code == 200
+    assert 'ProfessionNorm' not in response.json()
+
+    friend_id = response.json()['FriendID']
+    response = client.get('/friends/search', params={'profession': '---'})
+    assert response.status_code == 200
+    assert response.json()['items'] == []
+
+    assert client.delete(f'/friends/delete/{friend_id}').status_code == 200
+
+
+# ============================================================
+# Test: Bulk import reports an outcome for every record
+# ============================================================
+def test_create_friends_batch():
+    records = [
+        {"name": "Тест-Пакет-1", "profession": "Тестувальник", "profession_description": "Пакетний імпорт", "photo": "one.jpg"},
+        {"name": "Тест-Пакет-2", "profession": "Тестувальник", "profession_description": "Пакетний імпорт", "photo": "two.jpg"},
+        {"name": "Тест-Пакет-3", "profession": "Тестувальник", "profession_description": "Немає фото", "photo": "missing.jpg"}
+    ]
+    files = [
+        ('photos', ('one.jpg', b"\xFF\xD8\xFF\xE0" + b"\x00" * 100, 'image/jpeg')),
+        ('photos', ('two.jpg', b"\xFF\xD8\xFF\xE0" + b"\x00" * 100, 'image/jpeg'))
+    ]
+    response = client.post('/friends/batch', data={'records': json.dumps(records)}, files=files)
+    assert response.status_code == 200
+
+    results = response.json()
+    assert [r['status'] for r in results] == ['created', 'created', 'failed']
+    assert results[2]['error'] == 'Photo not found: missing.jpg'
+
+    created_ids = [result['friend']['FriendID'] for result in results[:2]]
+    response = client.get('/friends', params={'ids': ','.join(created_ids + ['missing-id'])})
+    assert [f['Name'] for f in response.json()['items']] == ['Тест-Пакет-1', 'Тест-Пакет-2']
+
+    response = client.post('/friends/delete/batch', json={'ids': created_ids + ['missing-id']})
+    assert response.status_code == 200
+    assert sorted(response.json()['deleted']) == sorted(created_ids)
+    assert response.json()['not_found'] == ['missing-id']
+    assert client.get(f'/friends/{created_ids[0]}').status_code == 404
+
+
 # ============================================================
 # Test: Delete both previously created friends
 # ============================================================
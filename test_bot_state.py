@@ -0,0 +1,54 @@
+import asyncio
+import time
+from bot_state import MemorySessionStore, SQLiteSessionStore, dump_session, new_session
+
+
+# =====================================================
+# Test: Sessions are stored compactly and dropped when empty
+# =====================================================
+def test_memory_session_round_trip():
+    async def scenario():
+        store = MemorySessionStore(ttl=60, max_sessions=10)
+        await store.update(1, state=1, draft={'name': 'Alice'})
+        session = await store.get(1)
+        await store.update(1, state=0, draft={})
+        return session, await store.get(1), len(store.sessions)
+
+    session, cleared, size = asyncio.run(scenario())
+    assert session == {'state': 1, 'draft': {'name': 'Alice'}, 'next_action': None, 'ai_friend_id': None, 'friend_cursors': []}
+    assert cleared == new_session()
+    assert size == 0
+    assert dump_session(session) == '{"state":1,"draft":{"name":"Alice"}}'
+
+
+# =====================================================
+# Test: Memory store keeps at most max_sessions users
+# =====================================================
+def test_memory_store_is_bounded():
+    async def scenario():
+        store = MemorySessionStore(ttl=60, max_sessions=2)
+        for user_id in range(3):
+            await store.update(user_id, state=6)
+        return [(await store.get(user_id))['state'] for user_id in range(3)]
+
+    assert asyncio.run(scenario()) == [0, 6, 6]
+
+
+# =====================================================
+# Test: SQLite sessions survive a new store instance
+# and expire after the TTL
+# =====================================================
+def test_sqlite_sessions_persist_and_expire(tmp_path):
+    path = str(tmp_path / 'bot_state.sqlite3')
+
+    async def scenario():
+        await SQLiteSessionStore(path, ttl=0.2).update(7, state=6, next_action='delete_friend_action')
+        restored = await SQLiteSessionStore(path, ttl=0.2).get(7)
+        time.sleep(0.3)
+        expired = await SQLiteSessionStore(path, ttl=0.2).get(7)
+        return restored, expired
+
+    restored, expired = asyncio.run(scenario())
+    assert restored['state'] == 6
+    assert restored['next_action'] == 'delete_friend_action'
+    assert expired == new_session()
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+from starlette.testclient import TestClient
+from telegram import Bot
+from bot_webhook import WebhookReceiver, SECRET_HEADER
+
+SECRET = 'test-secret'
+
+
+# =====================================================
+# Canned Telegram update and a stand-in application
+# that records the updates it is asked to process
+# =====================================================
+def make_update(update_id: int, text: str = '/start') -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'},
+            'text': text
+        }
+    }
+
+
+def make_application(delay: float = 0.0):
+    processed = []
+
+    async def process_update(update):
+        await asyncio.sleep(delay)
+        processed.append(update)
+
+    return SimpleNamespace(bot=Bot('123456:TEST'), process_update=process_update), processed
+
+
+# =====================================================
+# Test: A valid update reaches the handlers
+# =====================================================
+def test_update_is_processed():
+    application, processed = make_application()
+    receiver = WebhookReceiver(application, SECRET, path='/telegram')
+    with TestClient(receiver.asgi_app()) as client:
+        response = client.post('/telegram', json=make_update(1, 'hello'), headers={SECRET_HEADER: SECRET})
+        assert response.status_code == 200
+
+    assert [update.update_id for update in processed] == [1]
+    assert processed[0].message.text == 'hello'
+
+
+# =====================================================
+# Test: Updates without the right secret are rejected
+# =====================================================
+def test_wrong_secret_is_rejected():
+    application, processed = make_application()
+    receiver = WebhookReceiver(application, SECRET, path='/telegram')
+    with TestClient(receiver.asgi_app()) as client:
+        assert client.post('/telegram', json=make_update(1)).status_code == 403
+        assert client.post('/telegram', json=make_update(2), headers={SECRET_HEADER: 'wrong'}).status_code == 403
+
+    assert processed == []
+
+
+# =====================================================
+# Test: Malformed bodies are rejected
+# =====================================================
+def test_invalid_body_is_rejected():
+    application, processed = make_application()
+    receiver = WebhookReceiver(application, SECRET, path='/telegram')
+    with TestClient(receiver.asgi_app()) as client:
+        response = client.post('/telegram', content=b'not json', headers={SECRET_HEADER: SECRET})
+        assert response.status_code == 400
+
+    assert processed == []
+
+
+# =====================================================
+# Test: A full queue answers 503 so Telegram retries
+# =====================================================
+def test_full_queue_answers_503():
+    application, processed = make_application(delay=0.5)
+    receiver = WebhookReceiver(application, SECRET, path='/telegram', queue_size=1, workers=1)
+    with TestClient(receiver.asgi_app()) as client:
+        statuses = [
+            client.post('/telegram', json=make_update(i), headers={SECRET_HEADER: SECRET}).status_code
+            for i in range(4)
+        ]
+
+    assert 503 in statuses
+    assert len(processed) == statuses.count(200)
+    assert receiver.rejected == statuses.count(503)
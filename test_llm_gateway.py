@@ -0,0 +1,150 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from llm_gateway import LLMGateway, LLMBusyError
+
+# =====================================================
+# Local fake OpenAI server: echoes the last message back
+# after a short delay and records upstream concurrency
+# =====================================================
+fake_openai = FastAPI()
+upstream = {'calls': 0, 'active': 0, 'max_active': 0}
+
+
+@fake_openai.post('/v1/chat/completions')
+async def fake_chat_completions(request: Request):
+    body = await request.json()
+    upstream['calls'] += 1
+    upstream['active'] += 1
+    upstream['max_active'] = max(upstream['max_active'], upstream['active'])
+    try:
+        await asyncio.sleep(0.2)
+    finally:
+        upstream['active'] -= 1
+    content = body['messages'][-1]['content']
+    if body.get('stream'):
+        return StreamingResponse(fake_chunks(body['model'], content.split()), media_type='text/event-stream')
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body['model'],
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': f' echo: {content} '},
+            'finish_reason': 'stop'
+        }]
+    }
+
+
+async def fake_chunks(model: str, words):
+    for word in words:
+        chunk = {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]
+        }
+        yield f'data: {json.dumps(chunk)}\n\n'
+    yield 'data: [DONE]\n\n'
+
+
+@pytest.fixture(scope='module')
+def fake_openai_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_openai, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f'http://127.0.0.1:{port}/v1'
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def reset_upstream():
+    upstream.update(calls=0, active=0, max_active=0)
+
+
+def make_gateway(url: str, **kwargs) -> LLMGateway:
+    return LLMGateway(api_key='sk-test', base_url=url, **kwargs)
+
+
+def ask(gateway: LLMGateway, content: str):
+    return gateway.complete('gpt-4o', [{'role': 'user', 'content': content}], 0.7)
+
+
+# =====================================================
+# Test: A completion goes through the shared client
+# =====================================================
+def test_complete_returns_answer(fake_openai_url):
+    async def scenario():
+        gateway = make_gateway(fake_openai_url)
+        return await ask(gateway, 'hello')
+
+    assert asyncio.run(scenario()) == 'echo: hello'
+    assert upstream['calls'] == 1
+
+
+# =====================================================
+# Test: Identical in-flight prompts share one upstream call
+# =====================================================
+def test_identical_prompts_are_coalesced(fake_openai_url):
+    async def scenario():
+        gateway = make_gateway(fake_openai_url)
+        answers = await asyncio.gather(*[ask(gateway, 'same question') for _ in range(5)])
+        return gateway, answers
+
+    gateway, answers = asyncio.run(scenario())
+    assert answers == ['echo: same question'] * 5
+    assert upstream['calls'] == 1
+    assert gateway.coalesced_calls == 4
+
+
+# =====================================================
+# Test: Upstream concurrency never exceeds the limit
+# =====================================================
+def test_concurrency_is_bounded(fake_openai_url):
+    async def scenario():
+        gateway = make_gateway(fake_openai_url, max_concurrency=2)
+        return await asyncio.gather(*[ask(gateway, f'question {i}') for i in range(6)])
+
+    answers = asyncio.run(scenario())
+    assert len(set(answers)) == 6
+    assert upstream['calls'] == 6
+    assert upstream['max_active'] <= 2
+
+
+# =====================================================
+# Test: Callers give up after the queue wait timeout
+# =====================================================
+def test_queue_timeout_raises_busy(fake_openai_url):
+    async def scenario():
+        gateway = make_gateway(fake_openai_url, max_concurrency=1, queue_timeout=0.05)
+        return await asyncio.gather(ask(gateway, 'first'), ask(gateway, 'second'), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert 'echo: first' in results
+    assert any(isinstance(result, LLMBusyError) for result in results)
+
+
+# =====================================================
+# Test: Streaming yields the answer piece by piece
+# =====================================================
+def test_stream_yields_pieces(fake_openai_url):
+    async def scenario():
+        gateway = make_gateway(fake_openai_url)
+        messages = [{'role': 'user', 'content': 'one two three'}]
+        return [piece async for piece in gateway.stream('gpt-4o', messages, 0.7)]
+
+    assert asyncio.run(scenario()) == ['one ', 'two ', 'three ']
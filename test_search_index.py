@@ -0,0 +1,74 @@
+import threading
+from search_index import SearchIndex, matches_query, normalize_profession
+
+
+def friend(friend_id: str, name: str, profession: str) -> dict:
+    return {'FriendID': friend_id, 'Name': name, 'Profession': profession}
+
+
+# =====================================================
+# Test: Every query word must prefix-match a word of
+# Name or Profession; exact matches rank first
+# =====================================================
+def test_prefix_search_and_ranking():
+    index = SearchIndex()
+    index.build([
+        friend('1', 'Alina Stone', 'Doctor'),
+        friend('2', 'Ali Baba', 'Senior Engineer'),
+        friend('3', 'Bob Alison', 'Engineer')
+    ])
+
+    assert [item['FriendID'] for item in index.search('ali')] == ['2', '1', '3']
+    assert [item['FriendID'] for item in index.search('ENG ali')] == ['2', '3']
+    assert [item['FriendID'] for item in index.search('ali', limit=1)] == ['2']
+    assert index.search('zzz') == []
+    assert matches_query(friend('4', 'Ali', 'Senior Engineer'), 'sen ali')
+    assert not matches_query(friend('4', 'Ali', 'Senior Engineer'), 'doc')
+
+
+# =====================================================
+# Test: Adds and removes update the index, including
+# those made while a rebuild is reading the table
+# =====================================================
+def test_changes_during_rebuild_are_kept():
+    index = SearchIndex()
+    index.add(friend('1', 'Alice', 'Chef'))
+
+    def scan():
+        yield friend('1', 'Alice', 'Chef')
+        index.add(friend('2', 'Alfred', 'Chef'))
+        index.remove('1')
+        yield friend('3', 'Albert', 'Chef')
+
+    index.build(scan())
+    assert sorted(item['FriendID'] for item in index.search('al')) == ['2', '3']
+    assert len(index) == 2
+
+    index.add(friend('3', 'Bert', 'Chef'))
+    assert [item['FriendID'] for item in index.search('al')] == ['2']
+    assert normalize_profession('  Senior   ENGINEER ') == 'senior engineer'
+
+
+# =====================================================
+# Test: Overlapping builds run one after another
+# =====================================================
+def test_overlapping_builds():
+    index = SearchIndex()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_scan():
+        started.set()
+        release.wait(5)
+        yield friend('1', 'Alice', 'Chef')
+
+    first = threading.Thread(target=index.build, args=(slow_scan(),))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=index.build, args=([friend('2', 'Alfred', 'Chef')],))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert [item['FriendID'] for item in index.search('al')] == ['2']
@@ -0,0 +1,94 @@
+import numpy as np
+import similarity_index
+from similarity_index import SimilarityIndex
+
+
+def friend(friend_id: str, description: str) -> dict:
+    return {'FriendID': friend_id, 'ProfessionDescription': description}
+
+
+FRIENDS = [
+    friend('1', 'Designs bridges and roads'),
+    friend('2', 'Designs bridges for railways'),
+    friend('3', 'Bakes bread and cakes'),
+    friend('4', 'Bakes cakes for weddings'),
+    friend('5', 'Repairs roads')
+]
+
+
+# =====================================================
+# Test: Neighbours are ranked by IDF-weighted cosine
+# and friends sharing no words are left out
+# =====================================================
+def test_similar_ranking():
+    index = SimilarityIndex(path=None, dimensions=4096)
+    index.build(FRIENDS)
+
+    assert [friend_id for friend_id, _ in index.similar('1')] == ['2', '5', '3']
+    assert [friend_id for friend_id, _ in index.similar('4', k=1)] == ['3']
+    assert index.similar('missing') is None
+
+    scores = dict(index.similar('1'))
+    assert 0 < scores['3'] < scores['5'] < scores['2'] < 1
+
+
+# =====================================================
+# Test: Deletes keep the matrix compact and the index
+# is reloaded from its memory-mapped files
+# =====================================================
+def test_incremental_changes_persist(tmp_path):
+    path = str(tmp_path / 'similarity')
+    index = SimilarityIndex(path=path, dimensions=4096)
+    index.add(friend('0', 'Bakes bread'))
+    index.build(FRIENDS)
+    index.remove('1')
+    index.add(friend('6', 'Builds bridges and roads'))
+    expected = index.similar('2')
+
+    restored = SimilarityIndex(path=path, dimensions=4096)
+    assert restored.load()
+    assert len(restored) == 5
+    assert restored.similar('2') == expected
+    assert sorted(friend_id for friend_id, _ in expected) == ['4', '6']
+    assert not SimilarityIndex(path=path, dimensions=512).load()
+    assert np.array_equal(restored._df, restored._vectors[:, :len(restored)].sum(axis=1))
+
+
+# =====================================================
+# Test: Closed indexes ignore changes instead of
+# queueing them until the first build
+# =====================================================
+def test_changes_before_build_are_not_kept():
+    index = SimilarityIndex(path=None, dimensions=4096)
+    for n in range(100):
+        index.add(friend(f'x{n}', 'Bakes bread'))
+        index.remove(f'x{n}')
+
+    assert index._pending is None
+    assert not index.is_open
+    assert index.similar('x0') is None
+
+
+# =====================================================
+# Test: Processes sharing one path see each other's
+# writes, including after the files are regrown
+# =====================================================
+def test_shared_path_keeps_every_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(similarity_index, 'INITIAL_CAPACITY', 4)
+    path = str(tmp_path / 'similarity')
+    first = SimilarityIndex(path=path, dimensions=4096)
+    second = SimilarityIndex(path=path, dimensions=4096)
+    first.build(FRIENDS[:3])
+    assert second.load()
+
+    first.add(friend('A', 'Repairs bridges'))
+    second.add(friend('B', 'Repairs roads'))
+    first.add(friend('C', 'Bakes cakes'))
+    second.remove('3')
+
+    reader = SimilarityIndex(path=path, dimensions=4096)
+    assert reader.load()
+    assert sorted(reader._columns) == ['1', '2', 'A', 'B', 'C']
+    assert np.array_equal(reader._df, reader._vectors[:, :len(reader)].sum(axis=1))
+    assert 'B' in dict(first.similar('A'))
+    assert 'A' in dict(second.similar('B'))